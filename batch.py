@@ -0,0 +1,112 @@
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
+# batch.py
+# Headless processing of recorded footage, as fast as the machine allows:
+#   python batch.py footage.mp4 --jsonl detections.jsonl --video cropped.mp4 --track alice
+#   python batch.py frames_dir/ --jsonl detections.jsonl
+import argparse
+import json
+import sys
+import time
+
+import cv2
+
+from video.camera import Camera
+from video.detectors import DETECTOR_BACKENDS
+from video.events import face_records
+from video.utils import FrameCropper
+
+
+def box_list(box):
+    return None if box is None else [round(float(v), 1) for v in box]
+
+
+def frame_record(index, processor, faces, tracked_box):
+    return {"frame": index, "faces": face_records(processor, faces), "tracked_box": box_list(tracked_box)}
+
+
+def find_known_index(processor, name):
+    for idx, fname in enumerate(processor.known_names):
+        if name in (fname, os.path.splitext(fname)[0]):
+            return idx
+    raise SystemExit(f"No known face named {name!r}")
+
+
+def run(args):
+    from video.processor import FaceProcessor
+    processor = FaceProcessor(tracking_mode=not args.no_tracking, recognition_workers=args.workers,
+                              detector=args.detector, detector_min_recall=args.min_recall)
+    processor.detect_interval = args.detect_interval
+    processor.detect_scale = args.detect_scale
+    if args.min_face:
+        processor.min_face_size = (args.min_face, args.min_face)
+    processor.tracking_margin = args.margin
+    if args.track:
+        processor.set_tracked_index(find_known_index(processor, args.track))
+
+    camera = Camera(source=args.input)
+    size = tuple(int(v) for v in args.size.split("x")) if args.size else None
+    cropper = FrameCropper(args.ratio, size=size, height=args.height)
+    writer = None
+    if args.video:
+        fps = args.fps or camera.fps or 25
+        writer = cv2.VideoWriter(args.video, cv2.VideoWriter_fourcc(*"mp4v"), fps, cropper.size)
+    jsonl = open(args.jsonl, "w") if args.jsonl else None
+
+    frames = 0
+    start = time.perf_counter()
+    try:
+        while args.max_frames is None or frames < args.max_frames:
+            frame = camera.get_frame()
+            if frame is None:
+                break
+            faces, _ = processor.detect_faces(frame)
+            tracked_box = processor.get_tracked_box(faces)
+            if jsonl:
+                jsonl.write(json.dumps(frame_record(frames, processor, faces, tracked_box)) + "\n")
+            if writer:
+                writer.write(cropper(frame, tracked_box))
+            frames += 1
+            if args.progress and frames % args.progress == 0:
+                print(f"{frames} frames, {frames / (time.perf_counter() - start):.1f} fps", file=sys.stderr)
+    finally:
+        elapsed = time.perf_counter() - start
+        camera.release()
+        processor.close()
+        if writer:
+            writer.release()
+        if jsonl:
+            jsonl.close()
+
+    summary = {"frames": frames, "seconds": round(elapsed, 3), "fps": round(frames / elapsed, 2) if elapsed else 0.0}
+    print(json.dumps(summary))
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run face detection/recognition over a video file or image directory")
+    parser.add_argument("input", help="video file or directory of images")
+    parser.add_argument("--jsonl", help="write per-frame detections, identities and tracked box here")
+    parser.add_argument("--video", help="write the cropped output video here")
+    parser.add_argument("--track", help="known face (filename with or without extension) to crop to")
+    parser.add_argument("--ratio", default="16:9", choices=["16:9", "1:1", "16:10"])
+    parser.add_argument("--size", default=None, help="output video size, WIDTHxHEIGHT (overrides --height)")
+    parser.add_argument("--height", type=int, default=540, help="output video height, width follows --ratio")
+    parser.add_argument("--margin", type=float, default=1.5, help="tracking margin")
+    parser.add_argument("--fps", type=float, default=None, help="output video fps (defaults to the source fps)")
+    parser.add_argument("--detect-interval", type=int, default=5)
+    parser.add_argument("--detect-scale", type=float, default=1.0, help="run the detector on a downscaled frame")
+    parser.add_argument("--min-face", type=int, default=0, help="smallest face to look for, in source pixels")
+    parser.add_argument("--detector", default="haar", choices=["auto", *DETECTOR_BACKENDS],
+                        help="face detector backend, auto picks the fastest meeting --min-recall")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="recall target for --detector auto")
+    parser.add_argument("--no-tracking", action="store_true", help="run the full detector on every frame")
+    parser.add_argument("--workers", type=int, default=0, help="recognition worker processes")
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--progress", type=int, default=0, help="print throughput every N frames")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# benchmarks/detectors.py
+# Latency and accuracy of every face detector backend on the detector test set (or
+# latency only on a synthetic frame when there is none), and the backend that
+# --detector auto would pick.
+#   python -m benchmarks.detectors
+#   python -m benchmarks.detectors --testset my_frames/ --min-recall 0.95 --repeats 5
+import argparse
+import json
+import sys
+
+from video.detectors import DETECTOR_BACKENDS, TESTSET_DIR, benchmark_detectors, load_testset, select_detector
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Face detector backend benchmark")
+    parser.add_argument("--backends", nargs="+", default=list(DETECTOR_BACKENDS), choices=list(DETECTOR_BACKENDS))
+    parser.add_argument("--testset", default=TESTSET_DIR, help="images + annotations.json")
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per image")
+    args = parser.parse_args(argv)
+
+    samples = load_testset(args.testset)
+    log = lambda line: print(line, file=sys.stderr)
+    if samples:
+        choice, report = select_detector(args.min_recall, args.backends, samples, repeats=args.repeats, log=log)
+    else:
+        log(f"No test set in {args.testset}, measuring latency only")
+        choice, _ = select_detector(args.min_recall, args.backends, samples, log=log)
+        report = benchmark_detectors(args.backends, samples, repeats=args.repeats)
+    print(json.dumps({"images": len(samples), "min_recall": args.min_recall, "selected": choice,
+                      "backends": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
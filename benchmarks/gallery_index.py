@@ -0,0 +1,75 @@
+# benchmarks/gallery_index.py
+# Recall vs latency of the approximate gallery index against the exact scan.
+# Usage: python -m benchmarks.gallery_index --size 50000 --nprobe 1 4 8 16
+import argparse
+import json
+import time
+
+import numpy as np
+
+from video.gallery_index import ExactIndex, IVFIndex
+
+
+def synthetic_gallery(size, dim, identities, seed=0):
+    # Clustered unit vectors: several photos per person around one identity direction
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((identities, dim)).astype(np.float32)
+    labels = rng.integers(0, identities, size)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((size, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, centers
+
+
+def timed_search(index, queries, k):
+    start = time.perf_counter()
+    ids, _ = index.search(queries, k)
+    return ids, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def run(size, dim, queries, k, nprobes, nlist):
+    vectors, centers = synthetic_gallery(size, dim, max(1, size // 5))
+    rng = np.random.default_rng(1)
+    probe = centers[rng.integers(0, len(centers), queries)]
+    probe = probe + 0.35 * rng.standard_normal(probe.shape).astype(np.float32)
+    probe /= np.linalg.norm(probe, axis=1, keepdims=True)
+    ids = np.arange(size)
+
+    exact = ExactIndex()
+    exact.build(ids, vectors)
+    truth, exact_ms = timed_search(exact, probe, k)
+    results = [{"backend": "exact", "recall": 1.0, "ms_per_query": round(exact_ms, 4)}]
+
+    ivf = IVFIndex(nlist=nlist)
+    start = time.perf_counter()
+    ivf.build(ids, vectors)
+    build_s = time.perf_counter() - start
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        found, ms = timed_search(ivf, probe, k)
+        hits = sum(len(set(found[i]) & set(truth[i])) for i in range(queries))
+        results.append({
+            "backend": "ivf",
+            "nlist": len(ivf.centroids),
+            "nprobe": nprobe,
+            "recall": round(hits / float(queries * k), 4),
+            "ms_per_query": round(ms, 4),
+            "build_s": round(build_s, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gallery index recall/latency benchmark")
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=128)  # Facenet embedding size
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+    for row in run(args.size, args.dim, args.queries, args.k, args.nprobe, args.nlist):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
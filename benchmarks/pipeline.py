@@ -0,0 +1,256 @@
+# benchmarks/pipeline.py
+# Latency of the frame pipeline hot paths, stage by stage and end to end.
+# Runs offline: the Facenet model is replaced by a deterministic stub embedder.
+#   python -m benchmarks.pipeline --save baseline.json
+#   python -m benchmarks.pipeline --frames footage.mp4 --baseline baseline.json
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from video.camera import Camera
+from video.processor import FaceProcessor
+from video.stream_server import FrameBroadcaster
+from video.utils import TARGET_RATIOS, FrameCropper
+
+RESOLUTIONS = {"480p": (854, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+FACE_COUNTS = [0, 1, 4, 8]
+EMBEDDING_SIZE = 128  # Facenet
+
+
+def crop_to_box(frame, box):
+    # Old output path, step 1 (FrameCropper replaced it): slice the tracked box
+    if box is None:
+        return frame
+    x, y, w_box, h_box = box
+    x, y = int(max(0, x)), int(max(0, y))
+    x2, y2 = int(min(frame.shape[1], x + w_box)), int(min(frame.shape[0], y + h_box))
+    return frame[y:y2, x:x2]
+
+
+def apply_frame_ratio(frame, ratio_str, size=(960, 540)):
+    # Old output path, step 2: slice again to the ratio and resize into a new frame
+    h, w = frame.shape[:2]
+    target_ratio = TARGET_RATIOS.get(ratio_str, 16 / 9)
+    if w / h > target_ratio:
+        new_w = int(h * target_ratio)
+        x1 = (w - new_w) // 2
+        frame = frame[:, x1:x1 + new_w]
+    else:
+        new_h = int(w / target_ratio)
+        y1 = (h - new_h) // 2
+        frame = frame[y1:y1 + new_h, :]
+    return cv2.resize(frame, size)
+
+
+class StubEmbedder:
+    # Deterministic stand-in for FacenetEmbedder: the downsampled gray snip is the embedding
+    def __call__(self, face_imgs):
+        embeddings = []
+        for face_img in face_imgs:
+            small = cv2.resize(face_img, (16, 8), interpolation=cv2.INTER_AREA)
+            embeddings.append((cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32).ravel() - 127.5).tolist())
+        return embeddings
+
+
+class ReplayDetector:
+    # Runs the real detector (so detection cost is measured) but reports the synthetic
+    # scene's face boxes, which the detector cannot find in generated frames
+    def __init__(self, detector, boxes):
+        self.detector = detector
+        self.boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+
+    def detect(self, gray, min_size=None, max_size=None):
+        self.detector.detect(gray, min_size, max_size)
+        return self.boxes
+
+
+def synthetic_frame(size, faces, seed=0):
+    # Smooth random background with `faces` textured squares laid out on a grid
+    rng = np.random.default_rng(seed)
+    w, h = size
+    frame = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (9, 9), 0)
+    side = h // 5
+    boxes = []
+    for i in range(faces):
+        x = (i % 4) * (w // 4) + (w // 4 - side) // 2
+        y = (i // 4) * (h // 2) + (h // 2 - side) // 2
+        frame[y:y + side, x:x + side] = rng.integers(0, 255, (side, side, 3), dtype=np.uint8)
+        boxes.append((x, y, side, side))
+    return frame, boxes
+
+
+def recorded_frames(source, limit):
+    camera = Camera(source=source)
+    frames = []
+    while len(frames) < limit:
+        frame = camera.get_frame()
+        if frame is None:
+            break
+        frames.append(frame)
+    camera.release()
+    return frames
+
+
+def make_processor(gallery_size, tracking_mode=False, seed=0):
+    processor = FaceProcessor(tracking_mode=tracking_mode, known_faces_dir=None)
+    processor.embedder = StubEmbedder()
+    rng = np.random.default_rng(seed)
+    processor.set_known_faces([f"person_{i}.jpg" for i in range(gallery_size)],
+                              rng.standard_normal((gallery_size, EMBEDDING_SIZE)).astype(np.float32))
+    return processor
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def measure(func, iterations, warmup):
+    for i in range(warmup):
+        func(i)
+    times = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        func(i)
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {
+        "p50_ms": round(float(np.percentile(times, 50)), 4),
+        "p95_ms": round(float(np.percentile(times, 95)), 4),
+        "p99_ms": round(float(np.percentile(times, 99)), 4),
+        "mean_ms": round(float(times.mean()), 4),
+        "throughput_per_s": round(1000.0 / float(times.mean()), 2) if times.mean() > 0 else 0.0,
+        "iterations": iterations,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def full_pipeline(processor, broadcaster, ratio="16:9"):
+    # One frame through the same steps as App.process_frame + stream encode
+    cropper = FrameCropper(ratio)
+
+    def step(frame):
+        faces, _ = processor.detect_faces(frame)
+        output = cropper(frame, processor.get_tracked_box(faces))
+        broadcaster.publish(output)
+        broadcaster.wait_jpeg(broadcaster.seq - 1, timeout=0)
+    return step
+
+
+def run_suite(args):
+    results = {}
+
+    def bench(name, func):
+        results[name] = measure(func, args.iterations, args.warmup)
+        print(f"{name:40s} p50 {results[name]['p50_ms']:9.3f} ms  p95 {results[name]['p95_ms']:9.3f} ms", file=sys.stderr)
+
+    plain = make_processor(args.gallery)
+    broadcaster = FrameBroadcaster()
+    output, _ = synthetic_frame((960, 540), 0)
+    bench("stream_encode/960x540", lambda i: (broadcaster.publish(output), broadcaster.wait_jpeg(broadcaster.seq - 1, 0)))
+
+    for res in args.resolutions:
+        size = RESOLUTIONS[res]
+        empty, _ = synthetic_frame(size, 0)
+        bench(f"detect_faces/{res}", lambda i: plain.detect_faces(empty))
+        cropper = FrameCropper("16:9")
+        box = (size[0] // 3, size[1] // 4, size[0] // 4, size[1] // 2)
+        bench(f"apply_frame_ratio/{res}", lambda i: apply_frame_ratio(crop_to_box(empty, box), "16:9"))
+        bench(f"crop_resize/{res}", lambda i: cropper(empty, box))
+        for count in args.faces:
+            if count == 0:
+                continue
+            frame, boxes = synthetic_frame(size, count)
+            faces = np.array(boxes, dtype=np.int32)
+            bench(f"identify_faces/{res}/{count}faces", lambda i: plain.identify_faces(frame, faces))
+            plain.set_tracked_index(0)
+            bench(f"get_tracked_box/{res}/{count}faces", lambda i: plain.get_tracked_box(faces))
+            plain.set_tracked_index(None)
+
+            tracked = make_processor(args.gallery, tracking_mode=True)
+            tracked.detector = ReplayDetector(tracked.detector, boxes)
+            tracked.roi_detection = False  # replayed boxes are full-frame coordinates
+            tracked.set_tracked_index(0)
+            step = full_pipeline(tracked, FrameBroadcaster())
+            bench(f"pipeline/{res}/{count}faces", lambda i: step(frame))
+
+    snip, _ = synthetic_frame((160, 160), 0)
+    bench("is_known/1face", lambda i: plain._is_known(snip))
+    rng = np.random.default_rng(1)
+    for count in args.faces:
+        if count:
+            embeddings = list(rng.standard_normal((count, EMBEDDING_SIZE)).astype(np.float32))
+            bench(f"match_embeddings/{count}faces", lambda i: plain.match_embeddings(embeddings))
+
+    if args.frames:
+        frames = recorded_frames(args.frames, args.iterations + args.warmup)
+        if frames:
+            processor = make_processor(args.gallery, tracking_mode=True)
+            step = full_pipeline(processor, FrameBroadcaster())
+            bench("detect_faces/recorded", lambda i: plain.detect_faces(frames[i % len(frames)]))
+            bench("pipeline/recorded", lambda i: step(frames[i % len(frames)]))
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "gallery": args.gallery,
+            "iterations": args.iterations,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    # Returns names whose p50 got slower than baseline by more than tolerance
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base or not base["p50_ms"]:
+            continue
+        ratio = result["p50_ms"] / base["p50_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:40s} {base['p50_ms']:9.3f} -> {result['p50_ms']:9.3f} ms  x{ratio:.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Frame pipeline benchmark suite")
+    parser.add_argument("--resolutions", nargs="+", default=list(RESOLUTIONS), choices=list(RESOLUTIONS))
+    parser.add_argument("--faces", nargs="+", type=int, default=FACE_COUNTS)
+    parser.add_argument("--gallery", type=int, default=1000, help="synthetic known faces")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--frames", help="video file or image directory to benchmark on as well")
+    parser.add_argument("--save", help="write the JSON results here")
+    parser.add_argument("--baseline", help="JSON results to compare p50 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed p50 slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    report = run_suite(args)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
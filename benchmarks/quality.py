@@ -0,0 +1,71 @@
+# benchmarks/quality.py
+# Drives QualityController with a simulated load: a cost model of the frame pipeline
+# whose CPU contention changes over time. Shows the decisions, how many level changes
+# there were (oscillation check) and the frame rate reached in every load phase.
+#   python -m benchmarks.quality --target-fps 20
+#   python -m benchmarks.quality --phases 1.0:300 3.0:600 1.0:600
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from video.quality import QualityController
+
+
+def frame_cost_ms(settings, contention, faces=2, rng=None):
+    # Rough per-frame cost in ms at contention 1.0, from the stage timings of a laptop:
+    # cascade on a 720p frame ~60 ms (scales with pixels) every detect_interval frames,
+    # template tracking ~2 ms, ~35 ms per face embedding every reverify_interval
+    # frames, resize + display ~6 ms and JPEG encode ~5 ms at 540p
+    detect = 60.0 * settings["detect_scale"] ** 2 / settings["detect_interval"]
+    embed = 35.0 * faces / settings["reverify_interval"]
+    pixels = (settings["output_height"] / 540) ** 2
+    output = 6.0 * pixels + 5.0 * pixels * (0.5 + settings["jpeg_quality"] / 160)
+    cost = (2.0 + detect + embed + output) * contention
+    if rng is not None:
+        cost *= rng.lognormal(0, 0.15)
+    return cost
+
+
+def simulate(controller, phases, faces=2, seed=0):
+    # phases: [(contention, frames)]; returns per-phase achieved fps and the final level
+    rng = np.random.default_rng(seed)
+    report = []
+    for contention, frames in phases:
+        costs = []
+        for _ in range(frames):
+            cost = frame_cost_ms(controller.settings, contention, faces, rng)
+            costs.append(cost)
+            controller.observe(cost)
+        tail = costs[len(costs) // 2:]  # after the controller had time to react
+        report.append({
+            "contention": contention,
+            "frames": frames,
+            "fps": round(1000.0 / float(np.mean(costs)), 1),
+            "settled_fps": round(1000.0 / float(np.mean(tail)), 1),
+            "level": controller.level,
+        })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="QualityController under a simulated load")
+    parser.add_argument("--target-fps", type=float, default=20)
+    parser.add_argument("--latency-budget", type=float, default=None, help="ms per frame instead of a target fps")
+    parser.add_argument("--phases", nargs="+", default=["1.0:300", "3.0:600", "6.0:600", "1.0:900"],
+                        help="contention:frames, in order")
+    parser.add_argument("--faces", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    phases = [(float(c), int(n)) for c, n in (p.split(":") for p in args.phases)]
+    controller = QualityController(lambda settings: None, target_fps=args.target_fps,
+                                   latency_budget_ms=args.latency_budget,
+                                   log=lambda line: print(line, file=sys.stderr))
+    report = simulate(controller, phases, args.faces)
+    print(json.dumps({"budget_ms": round(controller.budget_ms, 2), "changes": len(controller.decisions),
+                      "decisions": controller.decisions, "phases": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
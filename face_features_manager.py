@@ -1,40 +1,98 @@
 import os
-import pickle
 import threading
+import time
+import cv2
+from video.embedding_store import EmbeddingStore, file_hash
 
-KNOWN_FACES_DIR = "known_faces_pics"
-PICKLE_FILE = "known_faces.pkl"
+KNOWN_FACES_DIR = "assets/known_faces_pics"
+STORE_PATH = "assets/known_faces_store"  # .f32 matrix + .json manifest, see video/embedding_store.py
+
+_embedder = None
 
 def extract_face_features(image_path):
-    # ...existing code for extracting face features...
-    pass
+    # Facenet embedding of one image with the same preprocessing as enrollment, None on failure
+    global _embedder
+    img = cv2.imread(image_path)
+    if img is None:
+        return None
+    if _embedder is None:
+        from video.processor import FacenetEmbedder
+        _embedder = FacenetEmbedder()
+    return _embedder([img])[0]
 
 def load_face_features():
-    if os.path.exists(PICKLE_FILE):
-        with open(PICKLE_FILE, "rb") as f:
-            return pickle.load(f)
-    return {}
-
-def save_face_features(features):
-    with open(PICKLE_FILE, "wb") as f:
-        pickle.dump(features, f)
-
-def update_face_features():
-    features = load_face_features()
-    current_files = set(os.listdir(KNOWN_FACES_DIR))
-    # Remove deleted images
-    removed = [k for k in features if k not in current_files]
-    for k in removed:
-        del features[k]
-    # Add new images
-    for fname in current_files:
-        if fname not in features:
-            img_path = os.path.join(KNOWN_FACES_DIR, fname)
-            features[fname] = extract_face_features(img_path)
-    save_face_features(features)
-
-def background_update():
-    thread = threading.Thread(target=update_face_features, daemon=True)
-    thread.start()
+    # fname -> embedding (a row of the memory-mapped matrix, nothing is copied)
+    store = EmbeddingStore(STORE_PATH)
+    return {record["fname"]: store.vector(row) for row, record in store.live()}
+
+def _image_files(folder):
+    return {f for f in os.listdir(folder) if f.lower().endswith((".jpg", ".png"))}
+
+def snapshot(folder=KNOWN_FACES_DIR):
+    # fname -> (mtime, size), cheap enough to poll
+    state = {}
+    for fname in _image_files(folder):
+        try:
+            stat = os.stat(os.path.join(folder, fname))
+        except OSError:
+            continue  # removed while listing
+        state[fname] = (stat.st_mtime, stat.st_size)
+    return state
 
-# Call background_update() during app startup
+def update_face_features(known_faces_dir=KNOWN_FACES_DIR, store_path=STORE_PATH):
+    # Bring the store in line with the folder, embedding only new or changed images.
+    # Returns (changed, removed) filenames and the updated store.
+    store = EmbeddingStore(store_path)
+    current_files = _image_files(known_faces_dir)
+    # Tombstone deleted images
+    removed = [record["fname"] for _, record in store.live() if record["fname"] not in current_files]
+    store.delete(removed)
+    # Add new or changed images
+    changed = []
+    for fname in sorted(current_files):
+        img_path = os.path.join(known_faces_dir, fname)
+        try:
+            mtime = os.path.getmtime(img_path)
+        except OSError:
+            continue
+        if store.lookup(fname, mtime) is not None:
+            continue
+        content_hash = file_hash(img_path)
+        row = store.lookup_hash(content_hash)
+        embedding = store.vector(row).copy() if row is not None else extract_face_features(img_path)
+        if embedding is None:
+            continue
+        store.append([{"fname": fname, "mtime": mtime, "hash": content_hash}], [embedding])
+        changed.append(fname)
+    store.compact()
+    store.save()
+    return changed, removed, store
+
+def watch_known_faces(processor, interval=2.0, on_reload=None, stop_event=None):
+    # Polls processor.known_faces_dir; on any difference, embeds what changed and swaps
+    # the rebuilt gallery into the processor. Recognition keeps running on the old
+    # gallery until the swap.
+    folder = processor.known_faces_dir or KNOWN_FACES_DIR
+    last = None  # the first pass catches up on anything changed since enrollment listed the folder
+    while not (stop_event and stop_event.is_set()):
+        try:
+            state = snapshot(folder)
+            if state != last:
+                changed, removed, store = update_face_features(folder, processor.store_path)
+                if changed or removed:
+                    processor.reload_known_faces(changed, removed, store)
+                    print(f"Known faces reloaded: {len(changed)} added/changed, {len(removed)} removed")
+                    if on_reload:
+                        on_reload()
+                last = state
+        except Exception as e:
+            print(f"Known faces watcher error: {e}")
+        time.sleep(interval)
+
+def background_update(processor, interval=2.0, on_reload=None):
+    # Start the watcher on a daemon thread; set the returned event to stop it
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watch_known_faces, args=(processor, interval, on_reload, stop_event),
+                              name="known-faces-watcher", daemon=True)
+    thread.start()
+    return stop_event
@@ -0,0 +1,89 @@
+# gui/display.py
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+from video.metrics import metrics
+
+
+class CanvasDisplay:
+    # Shows frames on a Tk canvas without per-frame allocations: one canvas image item
+    # and one PhotoImage for the lifetime of the display, fed from two preallocated RGBA
+    # buffers. submit() is called from one producer thread (the render stage) and only
+    # converts into the back buffer; the Tk main loop picks up the newest frame at most
+    # fps times per second, frames submitted in between are dropped.
+    def __init__(self, canvas, fps=60):
+        self.canvas = canvas
+        self.fps = fps
+        self.shown = 0
+        self.dropped = 0
+        self._buffers = []  # [front, back] (h, w, 4) uint8
+        self._images = []  # PIL images sharing memory with _buffers
+        self._front = 0
+        self._pending = False
+        self._convert_ms = 0.0
+        self._lock = threading.Lock()
+        self._photo = None
+        self._item = None
+        self._running = False
+
+    def start(self):
+        # Call from the Tk main loop
+        self._running = True
+        self._tick()
+
+    def stop(self):
+        self._running = False
+
+    def submit(self, frame):
+        # frame: BGR uint8. Cheap to call at any rate.
+        start = time.perf_counter()
+        h, w = frame.shape[:2]
+        with self._lock:
+            if not self._buffers or self._buffers[0].shape[:2] != (h, w):
+                self._allocate(w, h)
+            back = 1 - self._front
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA, dst=self._buffers[back])
+        with self._lock:
+            if self._pending:
+                self.dropped += 1  # the previous frame was never shown
+                metrics.incr("frames_dropped_display")
+            self._front = back
+            self._pending = True
+            self._convert_ms = (time.perf_counter() - start) * 1000
+
+    def _allocate(self, w, h):
+        self._buffers = [np.zeros((h, w, 4), dtype=np.uint8) for _ in range(2)]
+        # "raw" RGBA frombuffer shares the numpy memory, no copy per frame
+        self._images = [Image.frombuffer("RGBA", (w, h), buf, "raw", "RGBA", 0, 1) for buf in self._buffers]
+        self._pending = False
+
+    def _tick(self):
+        if not self._running:
+            return
+        try:
+            self._present()
+        finally:
+            self.canvas.after(max(1, int(1000 / self.fps)), self._tick)
+
+    def _present(self):
+        # The lock is held while pasting, so submit() can't swap onto the buffer in use
+        with self._lock:
+            if not self._pending:
+                return
+            start = time.perf_counter()
+            image = self._images[self._front]
+            if self._photo is None or (self._photo.width(), self._photo.height()) != image.size:
+                self._photo = ImageTk.PhotoImage(image)
+                if self._item is None:
+                    self._item = self.canvas.create_image(0, 0, anchor="nw", image=self._photo)
+                else:
+                    self.canvas.itemconfigure(self._item, image=self._photo)
+            else:
+                self._photo.paste(image)  # in place, same Tk image
+            self._pending = False
+            self.shown += 1
+            metrics.observe("display", self._convert_ms + (time.perf_counter() - start) * 1000)
@@ -0,0 +1,109 @@
+# gui/face_list.py
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+
+import customtkinter as ctk
+import cv2
+from PIL import Image, ImageTk
+
+
+class VirtualFaceList(ctk.CTkFrame):
+    # Scrollable list of known faces that only builds Tk images for the rows in view.
+    # All rows are drawn on one canvas; scrolling drops the images of rows that left
+    # the view and creates the ones that entered it. Thumbnails that are not cached yet
+    # are regenerated on a background thread and drawn when ready.
+    ROW_HEIGHT = 130
+
+    def __init__(self, master, get_faces, on_select, height=200, **kwargs):
+        super().__init__(master, **kwargs)
+        self.get_faces = get_faces  # () -> current list of KnownFace
+        self.on_select = on_select  # (index, face) -> None
+        self.canvas = tk.Canvas(self, height=height, bg="#232837", highlightthickness=0, bd=0,
+                                yscrollincrement=self.ROW_HEIGHT // 4)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.status_label = ctk.CTkLabel(self, text="", font=("Segoe UI", 12, "italic"), text_color="#B0B8C7")
+        self.status_label.pack(side="bottom", fill="x")
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self._rows = {}  # index -> (face, PhotoImage or None, canvas item ids)
+        self._loader = ThreadPoolExecutor(max_workers=1)
+        self._region = None  # (width, rows) the scrollregion was last set for
+        self.canvas.bind("<Configure>", lambda e: self.refresh())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", lambda e: self._scroll(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self._scroll(-1))  # X11 wheel
+        self.canvas.bind("<Button-5>", lambda e: self._scroll(1))
+
+    def set_status(self, text):
+        self.status_label.configure(text=text)
+
+    def refresh(self, reset=False):
+        # Redraw the rows in view; reset=True after the gallery was renumbered
+        faces = self.get_faces()
+        width = self.canvas.winfo_width()
+        if self._region != (width, len(faces)):
+            # only on a real change: setting it re-triggers yscrollcommand -> refresh
+            if self._region is None or self._region[0] != width:
+                reset = True  # rows are centered on the old width
+            self._region = (width, len(faces))
+            self.canvas.configure(scrollregion=(0, 0, width, len(faces) * self.ROW_HEIGHT))
+        if reset:
+            for index in list(self._rows):
+                self._drop(index)
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.ROW_HEIGHT))
+        last = min(len(faces), int((top + self.canvas.winfo_height()) // self.ROW_HEIGHT) + 1)
+        for index in list(self._rows):
+            if not first <= index < last or self._rows[index][0] is not faces[index]:
+                self._drop(index)
+        for index in range(first, last):
+            if index not in self._rows:
+                self._draw(index, faces[index])
+
+    def _draw(self, index, face):
+        x = self.canvas.winfo_width() / 2
+        y = index * self.ROW_HEIGHT
+        items = [self.canvas.create_text(x, y + 115, text=face.label, fill="#E0E6F0", font=("Segoe UI", 11, "bold"))]
+        photo = None
+        if face.thumbnail is not None:
+            photo = self._photo(face.thumbnail_image())
+            items.append(self.canvas.create_image(x, y + 5, anchor="n", image=photo))
+        else:
+            items.append(self.canvas.create_rectangle(x - 50, y + 5, x + 50, y + 105, outline="#3B4257"))
+            self._loader.submit(self._load, index, face)
+        self._rows[index] = (face, photo, items)
+
+    def _drop(self, index):
+        _, _, items = self._rows.pop(index)
+        for item in items:
+            self.canvas.delete(item)
+
+    def _load(self, index, face):
+        face.thumbnail_image()  # reads the original from disk and caches the thumbnail on the record
+        self.after(0, self._loaded, index, face)
+
+    def _loaded(self, index, face):
+        row = self._rows.get(index)
+        if row is not None and row[0] is face and face.thumbnail is not None:
+            self._drop(index)
+            self._draw(index, face)
+
+    @staticmethod
+    def _photo(bgr):
+        if bgr is None:
+            return None
+        return ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)))
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    def _scroll(self, units):
+        self.canvas.yview_scroll(units, "units")
+
+    def _on_click(self, event):
+        index = int(self.canvas.canvasy(event.y) // self.ROW_HEIGHT)
+        faces = self.get_faces()
+        if 0 <= index < len(faces):
+            self.on_select(index, faces[index])
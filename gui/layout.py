@@ -2,15 +2,22 @@
 import customtkinter as ctk
 from gui.controller import Controller
 import threading
-import cv2
-from PIL import Image, ImageTk
+from gui.display import CanvasDisplay
+from gui.face_list import VirtualFaceList
 from video.camera import Camera
+from video.pipeline import Pipeline
+from video.utils import FrameCropper
+from video.virtual_cam import VirtualCamSink
+from video.metrics import metrics, STAGES
 import psutil
 import time
 import os
 import pyvirtualcam  # Add this import
-import numpy as np  # Fix for "np" not defined
-from video.stream_server import start_stream_server, frame_lock
+from video.events import face_records
+from video.stream_server import start_stream_server, publish_frame, publish_metadata, broadcaster, events
+from video.quality import QualityController, apply_settings
+from video.async_stream_server import AsyncStreamServer
+from face_features_manager import background_update
 from tkinter import messagebox  # Add this import
 try:
     import GPUtil
@@ -39,42 +46,73 @@ class App(ctk.CTk):
         self.margin_value = ctk.DoubleVar(value=1.5)
 
         self.processor = None  # Will be set after background loading
-        self.face_widgets = []
-        self.loading_label = None
+        self.detector_backend = "auto"  # fastest detector meeting the recall target on the test set
+        self.pipeline = None  # Started once the processor is ready
+        self.display_fps = 60  # canvas refresh cap, frames arriving faster are dropped
+        # Crop + ratio + resize in one step into reused buffers; output is 540 px high
+        # with the width following the ratio, or a fixed size=(w, h)
+        self.cropper = FrameCropper(ratio="16:9", height=540)
+        # Trades detection, re-verification and output quality for frame rate under load
+        self.target_fps = 20
+        self.quality = QualityController(self.apply_quality, target_fps=self.target_fps)
         self.running = True
         self.virtual_cam = None  # Ensure virtual_cam is not initialized automatically
+        self.virtual_cam_sink = None  # sends to virtual_cam from its own thread at the device fps
+        self.virtual_cam_fps = 20
         self.streaming_mode = ctk.StringVar(value="stream")  # Default to "stream"
+        # Plain copy of streaming_mode for the render thread (Tk variables are only read
+        # on the Tk thread); updated by change_output_mode
+        self.output_mode = self.streaming_mode.get()
+        self.stream_backend = "flask"  # or "async": asyncio server with per-client buffers and renditions
+        self.async_server = None  # the AsyncStreamServer once started, gets the quality level's JPEG quality
+        self.stream_server_started = False
+        # Detection metadata at /events: changes only, at most this many events per second
+        self.metadata_rate = 5
+        events.rate = self.metadata_rate
         self.output_info_label = None  # Label to display mode-specific info
 
+        metrics.enabled = True  # per-stage timings for the stats panel and /metrics
+
         self.setup_layout()
         self.show_loading_indicator()
         threading.Thread(target=self.init_face_processor, daemon=True).start()
         self.after(1000, self.update_stats_panel)  # Start stats update
 
     def show_loading_indicator(self):
-        # Show a loading label in the face listbox
+        # Show a loading label under the face list
         if hasattr(self, "face_listbox"):
-            for widget in self.face_listbox.winfo_children():
-                widget.destroy()
-            self.loading_label = ctk.CTkLabel(self.face_listbox, text="Loading faces...", font=("Segoe UI", 12, "italic"), text_color="#B0B8C7")
-            self.loading_label.pack(pady=20)
+            self.face_listbox.set_status("Loading faces...")
 
     def init_face_processor(self):
         from video.processor import FaceProcessor
-        self.processor = FaceProcessor()
+        # The pipeline starts on an empty gallery; known faces stream in as they are enrolled
+        self.processor = FaceProcessor(tracking_mode=True, known_faces_dir=None, detector=self.detector_backend)
         self.after(0, self.on_face_processor_ready)
+        self.processor.enroll_known_faces(
+            "assets/known_faces_pics",
+            on_added=lambda first, faces: self.after(0, self.show_known_faces_thumbnails),
+        )
+        self.after(0, self.on_enrollment_done)
+        # Pick up pictures added, replaced or deleted while the app runs
+        background_update(self.processor, on_reload=lambda: self.after(0, self.face_listbox.refresh, True))
 
     def on_face_processor_ready(self):
-        if self.loading_label:
-            self.loading_label.destroy()
-        self.show_known_faces_thumbnails()
-        threading.Thread(target=self.video_loop, daemon=True).start()  # Removed virtual cam initialization here
+        # Capture, processing and rendering each run on their own thread
+        self.pipeline = Pipeline(self.read_camera_frame, self.process_frame, self.render_frame)
+        self.pipeline.start()
+
+    def on_enrollment_done(self):
+        self.face_listbox.set_status("")
 
     def init_virtual_camera(self):
         # Initialize pyvirtualcam with the desired resolution and fps
         if self.virtual_cam is None:  # Only initialize if not already running
             try:
-                self.virtual_cam = pyvirtualcam.Camera(width=960, height=540, fps=20, print_fps=False)
+                # Output frames are BGR, so they go to the device as they are
+                width, height = self.cropper.size
+                self.virtual_cam = pyvirtualcam.Camera(width=width, height=height, fps=self.virtual_cam_fps,
+                                                       print_fps=False, fmt=pyvirtualcam.PixelFormat.BGR)
+                self.virtual_cam_sink = VirtualCamSink(self.virtual_cam).start()
                 print(f"Virtual camera started: {self.virtual_cam.device}")
             except Exception as e:
                 print(f"Failed to start virtual camera: {e}")
@@ -96,27 +134,25 @@ class App(ctk.CTk):
         # Video Frame (16:9)
         self.video_frame = ctk.CTkCanvas(self, bg="#10131A", highlightthickness=0, bd=0)
         self.video_frame.grid(row=0, column=1, sticky="nsew", padx=10, pady=10)
+        # One persistent canvas image, refreshed from the Tk main loop only
+        self.display = CanvasDisplay(self.video_frame, fps=self.display_fps)
+        self.display.start()
         self.camera = Camera()
 
     def show_known_faces_thumbnails(self):
-        if not self.processor or not hasattr(self.processor, "known_faces"):
+        if not self.processor:
             return
-        self.face_widgets.clear()
-        for widget in self.face_listbox.winfo_children():
-            widget.destroy()
-        for idx, (face_img, _) in enumerate(self.processor.known_faces):
-            # Pass the filename (without extension) as the label
-            name = os.path.splitext(self.processor.known_names[idx])[0]
-            thumbnail = self.create_thumbnail(face_img, idx, name)
-            thumbnail.pack(pady=7)
-            self.face_widgets.append(thumbnail)
+        # Only the rows in view get Tk images, see gui/face_list.py
+        self.face_listbox.refresh()
+        if self.face_listbox.status_label.cget("text"):
+            self.face_listbox.set_status(f"Loading faces... ({len(self.processor.known_faces)})")
 
     def add_sidebar_widgets(self, parent):
         # Frame Ratio
         ctk.CTkLabel(parent, text="Frame Ratio", font=("Segoe UI", 16, "bold"), text_color="#E0E6F0").pack(pady=(18, 6))
         self.ratio_option = ctk.CTkOptionMenu(
             parent, values=["16:9", "1:1", "16:10"],
-            command=self.controller.change_ratio,
+            command=self.change_ratio,
             fg_color="#2D3346", button_color="#3B4257", dropdown_fg_color="#232837",
             dropdown_hover_color="#3B4257", corner_radius=12, text_color="#E0E6F0"
         )
@@ -135,7 +171,10 @@ class App(ctk.CTk):
 
         # Available Faces
         ctk.CTkLabel(parent, text="Available Faces", font=("Segoe UI", 15, "bold"), text_color="#E0E6F0").pack(pady=(10, 6))
-        self.face_listbox = ctk.CTkScrollableFrame(parent, height=200, fg_color="#232837", corner_radius=12)
+        self.face_listbox = VirtualFaceList(
+            parent, get_faces=lambda: self.processor.known_faces if self.processor else [],
+            on_select=self.select_known_face, height=200, fg_color="#232837", corner_radius=12
+        )
         self.face_listbox.pack(fill="both", expand=True, padx=8)
 
         # Stats Panel
@@ -188,6 +227,7 @@ class App(ctk.CTk):
         self.output_info_label.pack(pady=(10, 0))
 
     def change_output_mode(self, mode):
+        self.output_mode = mode
         if mode == "none":
             print("Stopped all video output.")
             self.stop_all_outputs()
@@ -197,13 +237,20 @@ class App(ctk.CTk):
             )
         elif mode == "stream":
             print("Switched to local streaming mode.")
-            threading.Thread(target=start_stream_server, daemon=True).start()
+            if not self.stream_server_started:
+                if self.stream_backend == "async":
+                    self.async_server = AsyncStreamServer(port=8080).run_in_thread()
+                    self.async_server.set_quality(self.quality.settings["jpeg_quality"])
+                else:
+                    threading.Thread(target=start_stream_server, daemon=True).start()
+                self.stream_server_started = True
             self.output_info_label.configure(
                 text="Streaming at:\nhttp://localhost:8080\n\n"
                      "Guide:\n"
                      "1. Open the above link in your browser.\n"
                      "2. Use the browser window to view the video stream.\n"
-                     "3. You can also use tools like OBS Studio to capture the stream.",
+                     "3. You can also use tools like OBS Studio to capture the stream.\n"
+                     "4. Who is in frame and where: http://localhost:8080/events",
                 fg_color="#1E5128"  # Green background for success
             )
         elif mode == "virtual_cam":
@@ -221,9 +268,10 @@ class App(ctk.CTk):
 
     def stop_all_outputs(self):
         # Stop streaming and virtual cam
-        global current_frame
-        with frame_lock:
-            current_frame = None
+        publish_frame(None)
+        if self.virtual_cam_sink:
+            self.virtual_cam_sink.stop()
+            self.virtual_cam_sink = None
         if self.virtual_cam:
             self.virtual_cam.close()
             self.virtual_cam = None
@@ -238,10 +286,33 @@ class App(ctk.CTk):
             if gpus:
                 gpu = gpus[0]
                 gpu_str = f"\nGPU: {gpu.load*100:.1f}% ({gpu.memoryUsed:.0f}MB/{gpu.memoryTotal:.0f}MB)"
+        drop_str = ""
+        if self.pipeline:
+            pipeline_stats = self.pipeline.stats()
+            drop_str = "\nDropped: " + " / ".join(
+                f"{name} {entry['dropped']}" for name, entry in pipeline_stats.items() if "dropped" in entry
+            ) + f" / display {self.display.dropped}"
+        stage_str = ""
+        for stage in STAGES:
+            ms = metrics.smoothed(stage)
+            if ms is not None:
+                stage_str += f"\n{stage:<13} {ms:6.1f} ms"
+        hits = metrics.counters.get("identity_cache_hits", 0)
+        misses = metrics.counters.get("identity_cache_misses", 0)
+        if hits + misses:
+            stage_str += f"\nID cache hits: {100.0 * hits / (hits + misses):.0f}%"
+        if self.quality.level:
+            stage_str += f"\nQuality: level {self.quality.level}/{len(self.quality.levels) - 1}"
+        if self.virtual_cam_sink:
+            cam = self.virtual_cam_sink.stats()
+            stage_str += f"\nVirtual cam: {cam['fps']} fps, {cam['repeated']} repeated / {cam['skipped']} skipped"
+        clients = metrics.gauges.get("stream_clients", 0)
+        if clients:
+            stage_str += f"\nStream clients: {clients}"
         stats = (
             f"CPU: {cpu:.1f}%\n"
             f"Memory: {mem:.1f}%\n"
-            f"FPS: {fps:.1f}{gpu_str}"
+            f"FPS: {fps:.1f}{gpu_str}{drop_str}{stage_str}"
         )
         self.stats_label.configure(text=stats)
         self.after(1000, self.update_stats_panel)
@@ -266,113 +337,58 @@ class App(ctk.CTk):
         except Exception as e:
             print(f"Failed to connect to DroidCam USB: {e}")
 
-    def video_loop(self):
-        global current_frame
-        while self.running:
-            if not self.processor:
-                time.sleep(0.1)
-                continue
-            frame = self.camera.get_frame()
-            if frame is None:
-                continue
+    def read_camera_frame(self):
+        camera = self.camera
+        if not camera:
+            return None
+        with metrics.timer("capture"):
+            return camera.get_frame()
 
+    def process_frame(self, frame):
+        with self.quality.timer():
             # Face detection + tracking
             faces, _ = self.processor.detect_faces(frame)
+            # Who is where, for /events subscribers; only changes become events
+            publish_metadata(face_records(self.processor, faces))
 
-            # Crop to tracked face
-            tracked_box = self.processor.get_tracked_box(faces)
-            if tracked_box is not None:
-                x, y, w_box, h_box = tracked_box
-                x, y = int(max(0, x)), int(max(0, y))
-                x2, y2 = int(min(frame.shape[1], x + w_box)), int(min(frame.shape[0], y + h_box))
-                frame = frame[y:y2, x:x2]
-
-            # Resize to preview resolution and apply aspect ratio
-            frame = self.apply_frame_ratio(frame)
-
-            # FPS calculation
-            now = time.time()
-            self.fps = 1.0 / (now - self.last_frame_time) if self.last_frame_time else 0
-            self.last_frame_time = now
-
-            # Convert to tkinter-compatible image
-            img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(img)
-            imgtk = ImageTk.PhotoImage(image=img)
-
-            # Update canvas
-            self.video_frame.create_image(0, 0, anchor="nw", image=imgtk)
-            self.video_frame.image = imgtk  # Prevent garbage collection
-
-            # Send frame to virtual webcam
-            if self.streaming_mode.get() == "virtual_cam" and self.virtual_cam:
-                try:
-                    # pyvirtualcam expects RGB numpy array
-                    self.virtual_cam.send(np.array(img))
-                    self.virtual_cam.sleep_until_next_frame()
-                except Exception as e:
-                    print(f"Virtual cam error: {e}")
-
-            # Update the current frame for streaming
-            if self.streaming_mode.get() == "stream":
-                with frame_lock:
-                    current_frame = frame
-
-    def create_thumbnail(self, face_snip, index, name):
-        face_snip = cv2.resize(face_snip, (100, 100))
-        img = cv2.cvtColor(face_snip, cv2.COLOR_BGR2RGB)
-        pil_img = Image.fromarray(img)
-        thumb = ImageTk.PhotoImage(pil_img)
-
-        label = ctk.CTkLabel(
-            self.face_listbox,
-            image=thumb,
-            text=name,  # Use the filename as label
-            compound="top",
-            fg_color="#232837",
-            corner_radius=10,
-            text_color="#E0E6F0",
-            font=("Segoe UI", 11, "bold")
-        )
-        label.image = thumb
-
-        def on_click():
-            if not self.processor:
-                return
-            if self.processor.tracked_index == index:
-                self.processor.set_tracked_index(None)
-                print("Exited face tracking")
-            else:
-                self.processor.set_tracked_index(index)
-                print(f"Tracking face #{index} ({name})")
-
-        label.bind("<Button-1>", lambda e: on_click())
-        return label
-
-    def apply_frame_ratio(self, frame):
-        h, w = frame.shape[:2]
-        ratio_str = self.ratio_option.get()
-        target_ratios = {
-            "16:9": 16 / 9,
-            "1:1": 1.0,
-            "16:10": 16 / 10
-        }
-        target_ratio = target_ratios.get(ratio_str, 16/9)
-
-        # Compute center crop
-        current_ratio = w / h
-        if (current_ratio > target_ratio):
-            # too wide: crop width
-            new_w = int(h * target_ratio)
-            x1 = (w - new_w) // 2
-            frame = frame[:, x1:x1 + new_w]
+            with metrics.timer("crop_resize"):
+                # Crop to the tracked face at the selected aspect ratio, resized to the output size
+                return self.cropper(frame, self.processor.get_tracked_box(faces))
+
+    def apply_quality(self, settings):
+        apply_settings(settings, self.processor, self.cropper, broadcaster, self.async_server)
+
+    def render_frame(self, frame):
+        # FPS calculation
+        now = time.time()
+        self.fps = 1.0 / (now - self.last_frame_time) if self.last_frame_time else 0
+        self.last_frame_time = now
+
+        # Hand over to the Tk main loop, which shows it at the display rate
+        self.display.submit(frame)
+
+        # Send frame to virtual webcam
+        # (the sink paces itself and letterboxes other sizes, this never blocks)
+        if self.output_mode == "virtual_cam" and self.virtual_cam_sink:
+            self.virtual_cam_sink.submit(frame)
+
+        # Update the current frame for streaming
+        if self.output_mode == "stream":
+            publish_frame(frame)
+
+    def select_known_face(self, index, face):
+        if not self.processor:
+            return
+        if self.processor.tracked_index == index:
+            self.processor.set_tracked_index(None)
+            print("Exited face tracking")
         else:
-            # too tall: crop height
-            new_h = int(w / target_ratio)
-            y1 = (h - new_h) // 2
-            frame = frame[y1:y1 + new_h, :]
+            self.processor.set_tracked_index(index)
+            print(f"Tracking face #{index} ({face.label})")
 
-        return cv2.resize(frame, (960, 540))
+    def change_ratio(self, value):
+        self.controller.change_ratio(value)
+        self.cropper.ratio = value
 
     def change_margin(self, value):
         try:
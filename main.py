@@ -7,5 +7,5 @@ from gui.layout import App
 
 if __name__ == "__main__":
     app = App()
-    app.protocol("WM_DELETE_WINDOW", lambda: (app.camera.release(), app.destroy()))
+    app.protocol("WM_DELETE_WINDOW", lambda: (app.pipeline and app.pipeline.stop(), app.camera.release(), app.destroy()))
     app.mainloop()
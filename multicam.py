@@ -0,0 +1,72 @@
+import os
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
+os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
+# multicam.py
+# Headless multi-camera monitoring: one grabber and detector per camera, one shared
+# recognition model, one MJPEG feed per camera at http://host:8080/stream/<name> and
+# its detection metadata as server-sent events at http://host:8080/events/<name>
+#   python multicam.py rtsp://cam1/stream rtsp://cam2/stream 0 --stats 5
+import argparse
+import json
+import threading
+import time
+
+from video.detectors import DETECTOR_BACKENDS
+from video.metrics import metrics
+
+
+def run(args):
+    from video.multi_camera import MultiCameraMonitor
+    from video.processor import FaceProcessor
+    processor = FaceProcessor(recognition_workers=args.workers, detector=args.detector,
+                              detector_min_recall=args.min_recall)
+    # "auto" is benchmarked once, every stream uses the backend it picked
+    monitor = MultiCameraMonitor(processor, [int(s) if s.isdigit() else s for s in args.sources],
+                                 ratio=args.ratio, height=args.height, max_batch=args.max_batch,
+                                 processor_options={"detector": processor.detector.name},
+                                 event_rate=args.event_rate)
+    metrics.enabled = True
+    if args.async_server:
+        from video.async_stream_server import start_async_stream_server
+        server = lambda: start_async_stream_server(port=args.port)
+    else:
+        from video.stream_server import app
+        server = lambda: app.run(host="0.0.0.0", port=args.port, debug=False, threaded=True)
+    threading.Thread(target=server, daemon=True).start()
+    monitor.start()
+    for stream in monitor.streams:
+        print(f"{stream.name}: http://localhost:{args.port}/stream/{stream.name}"
+              f"  events: http://localhost:{args.port}/events/{stream.name}")
+    start = time.perf_counter()
+    try:
+        while args.duration is None or time.perf_counter() - start < args.duration:
+            time.sleep(args.stats)
+            print(json.dumps({"batches": monitor.engine.batches, "streams": monitor.stats()}))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        monitor.stop()
+        processor.close()
+    return monitor.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monitor several cameras with one shared recognition engine")
+    parser.add_argument("sources", nargs="+", help="camera indexes, stream URLs, video files or image directories")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--async-server", action="store_true", help="serve feeds with the asyncio server")
+    parser.add_argument("--ratio", default="16:9", choices=["16:9", "1:1", "16:10"])
+    parser.add_argument("--height", type=int, default=540, help="output feed height")
+    parser.add_argument("--max-batch", type=int, default=32, help="most face snips per shared model call")
+    parser.add_argument("--detector", default="haar", choices=["auto", *DETECTOR_BACKENDS],
+                        help="face detector backend, auto picks the fastest meeting --min-recall")
+    parser.add_argument("--min-recall", type=float, default=0.9, help="recall target for --detector auto")
+    parser.add_argument("--workers", type=int, default=0, help="recognition worker processes")
+    parser.add_argument("--event-rate", type=float, default=5.0, help="most metadata events per second per camera")
+    parser.add_argument("--stats", type=float, default=5.0, help="seconds between stats lines")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    main()
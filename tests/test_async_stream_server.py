@@ -0,0 +1,128 @@
+import http.client
+import socket
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from video.async_stream_server import AsyncStreamServer
+from video.events import MetadataBroadcaster
+from video.stream_server import FrameBroadcaster
+
+
+@pytest.fixture
+def feed():
+    # A producer publishing 640x480 noise (large JPEGs) as fast as it can
+    source = FrameBroadcaster()
+    stop = threading.Event()
+    frames = [np.random.default_rng(i).integers(0, 255, (480, 640, 3), dtype=np.uint8) for i in range(4)]
+
+    def produce():
+        i = 0
+        while not stop.is_set():
+            source.publish(frames[i % len(frames)])
+            i += 1
+            time.sleep(0.005)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    yield source
+    stop.set()
+    thread.join()
+
+
+def start_server(source, **options):
+    return AsyncStreamServer("127.0.0.1", 0, source=source, sources={"cam1": source}, events=MetadataBroadcaster(),
+                             event_sources={}, **options).run_in_thread()
+
+
+def open_stream(server, path, receive_buffer=None):
+    # Raw socket so the receive buffer can be shrunk before connecting
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if receive_buffer:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.settimeout(5)
+    sock.connect(("127.0.0.1", server.port))
+    sock.sendall(b"GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n" % path.encode())
+    stream = sock.makefile("rb")
+    status = stream.readline()
+    while stream.readline() not in (b"\r\n", b""):
+        pass
+    return sock, stream, status
+
+
+def read_jpeg(stream):
+    length = None
+    while (line := stream.readline()) != b"\r\n":
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    jpeg = stream.read(length)
+    stream.read(2)
+    return jpeg
+
+
+def test_slow_reader_skips_frames_instead_of_buffering(feed):
+    server = start_server(feed, client_buffer=2)
+    try:
+        sock, stream, status = open_stream(server, "/", receive_buffer=4096)
+        assert status.startswith(b"HTTP/1.1 200")
+        read_jpeg(stream)
+        time.sleep(1.5)  # stop reading while frames keep coming
+        rendition = server.renditions["full"]
+        client = next(iter(rendition.clients))
+        assert rendition.encoded > 20
+        assert client.skipped > 0
+        assert client.queue.qsize() <= 2
+        assert server.stats()["renditions"]["full"]["skipped"] == client.skipped
+        assert cv2.imdecode(np.frombuffer(read_jpeg(stream), np.uint8), cv2.IMREAD_COLOR) is not None
+        sock.close()
+    finally:
+        server.stop()
+
+
+@pytest.mark.parametrize("path", ["/", "/stream/cam1"])
+def test_low_rendition_is_a_smaller_encode(feed, path):
+    server = start_server(feed)
+    try:
+        sizes = {}
+        for rendition in ("full", "low"):
+            sock, stream, status = open_stream(server, f"{path}?rendition={rendition}")
+            assert status.startswith(b"HTTP/1.1 200")
+            jpeg = read_jpeg(stream)
+            sizes[rendition] = (cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape[1], len(jpeg))
+            sock.close()
+        assert sizes["full"][0] == 640
+        assert sizes["low"][0] == 320
+        assert sizes["low"][1] < sizes["full"][1]
+    finally:
+        server.stop()
+
+
+def test_connection_past_max_clients_gets_503(feed):
+    server = start_server(feed, max_clients=2)
+    try:
+        viewers = [open_stream(server, "/") for _ in range(2)]
+        assert all(status.startswith(b"HTTP/1.1 200") for _, _, status in viewers)
+        sock, _, status = open_stream(server, "/")
+        assert status.startswith(b"HTTP/1.1 503")
+        assert server.rejected == 1
+        for viewer in viewers + [(sock,)]:
+            viewer[0].close()
+    finally:
+        server.stop()
+
+
+def test_metrics_endpoint(feed):
+    server = start_server(feed)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.getheader("Content-Type").startswith("text/plain")
+        assert response.read().startswith(b"# TYPE facetracker_stage_latency_ms summary")
+        conn.close()
+    finally:
+        server.stop()
@@ -0,0 +1,112 @@
+import json
+
+from video.events import MetadataBroadcaster
+
+
+def faces(x, identity=None):
+    return [{"box": [x, 10, 50, 50], "track_id": 1, "identity": identity, "score": 0.5}]
+
+
+def make_broadcaster(events, history=300):
+    clock = [0.0]
+    broadcaster = MetadataBroadcaster(rate=5, history=history, clock=lambda: clock[0])
+    for i in range(events):
+        clock[0] += 1.0
+        broadcaster.publish(faces(100 * i))
+    return broadcaster
+
+
+def ids(events):
+    return [event_id for event_id, _ in events]
+
+
+def test_only_changes_become_events():
+    broadcaster = make_broadcaster(1)
+    for x in (2, 5, 1, 8):  # jitter within min_move
+        broadcaster.publish(faces(x))
+    assert broadcaster.last_id == 1
+    assert broadcaster.frame == 5
+
+
+def test_new_subscriber_gets_newest_event():
+    broadcaster = make_broadcaster(5)
+    events = broadcaster.events_since(None)
+    assert ids(events) == [5]
+    assert json.loads(events[0][1])["faces"][0]["box"][0] == 400
+
+
+def test_resume_from_known_id():
+    broadcaster = make_broadcaster(5)
+    assert ids(broadcaster.events_since(2)) == [3, 4, 5]
+    assert ids(broadcaster.events_since(5)) == []
+    assert ids(broadcaster.wait_events(3, timeout=0)) == [4, 5]
+
+
+def test_reconnect_with_id_from_before_a_restart():
+    # The client saw id 500 from the previous server process; this one is at 5
+    broadcaster = make_broadcaster(5)
+    assert ids(broadcaster.events_since(500)) == [5]
+    assert ids(broadcaster.wait_events(500, timeout=0)) == [5]
+
+
+def test_reconnect_with_id_that_left_the_ring_buffer():
+    broadcaster = make_broadcaster(10, history=3)
+    assert ids(broadcaster.events_since(2)) == [10]
+    assert ids(broadcaster.events_since(7)) == [8, 9, 10]
+
+
+def test_reconnect_with_stale_id_before_any_event():
+    broadcaster = make_broadcaster(0)
+    assert broadcaster.events_since(500) == []
+    assert broadcaster.wait_events(500, timeout=0) == []
+    broadcaster.publish(faces(0))
+    assert ids(broadcaster.wait_events(500, timeout=0)) == [1]
+
+
+def test_changes_within_the_rate_are_coalesced():
+    clock = [0.0]
+    broadcaster = MetadataBroadcaster(rate=5, clock=lambda: clock[0])
+    broadcaster.publish(faces(0))
+    broadcaster.publish(faces(100))
+    broadcaster.publish(faces(200))
+    assert broadcaster.last_id == 1
+    clock[0] = 0.2
+    events = broadcaster.events_since(1)
+    assert ids(events) == [2]
+    assert json.loads(events[0][1])["faces"][0]["box"][0] == 200
+    assert broadcaster.coalesced == 1
+
+
+def test_jitter_of_a_pending_change_is_not_coalesced():
+    clock = [0.0]
+    broadcaster = MetadataBroadcaster(rate=5, clock=lambda: clock[0])
+    broadcaster.publish(faces(0))
+    for x in (100, 102, 97, 101):
+        broadcaster.publish(faces(x))
+    assert broadcaster.coalesced == 0
+    clock[0] = 0.2
+    assert ids(broadcaster.events_since(1)) == [2]
+
+
+def test_change_reverted_within_the_rate_is_dropped():
+    clock = [0.0]
+    broadcaster = MetadataBroadcaster(rate=5, clock=lambda: clock[0])
+    broadcaster.publish(faces(0))
+    broadcaster.publish(faces(0, identity="alice.jpg"))
+    broadcaster.publish(faces(3))  # back to the sent state before the slot came
+    clock[0] = 0.2
+    assert broadcaster.events_since(1) == []
+    assert broadcaster.wait_events(1, timeout=0) == []
+    assert broadcaster.last_id == 1
+    assert broadcaster.coalesced == 0
+
+
+def test_sse_endpoint_reconnect_with_stale_id(monkeypatch):
+    from video import stream_server
+    broadcaster = make_broadcaster(5)
+    monkeypatch.setitem(stream_server.event_streams, "cam1", broadcaster)
+    client = stream_server.app.test_client()
+    response = client.get("/events/cam1", headers={"Last-Event-ID": "500"}, buffered=False)
+    first = next(iter(response.response))
+    response.close()
+    assert first.startswith(b"id: 5\n")
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from video.gallery_index import ExactIndex, IVFIndex
+
+
+def unit_rows(count, seed):
+    vectors = np.random.default_rng(seed).normal(size=(count, 16)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("make", [ExactIndex, lambda: IVFIndex(nprobe=100)])
+def test_appended_matches_add_and_leaves_the_old_index_intact(make):
+    vectors = unit_rows(200, 0)
+    grown, reference = make(), make()
+    reference.build(np.arange(100), vectors[:100])
+    grown.build(np.arange(100), vectors[:100])
+    versions = [grown]
+    for start in range(100, 200, 16):
+        ids = np.arange(start, min(start + 16, 200))
+        versions.append(versions[-1].appended(ids, vectors[ids]))
+        reference.add(ids, vectors[ids])
+    queries = unit_rows(5, 1)
+    assert len(versions[-1]) == 200
+    np.testing.assert_array_equal(versions[-1].search(queries, 5)[0], reference.search(queries, 5)[0])
+    # every earlier version still sees exactly its own rows
+    for version, size in zip(versions, range(100, 201, 16)):
+        found = version.search(vectors[:size], 1)[0][:, 0]
+        np.testing.assert_array_equal(found, np.arange(size))
+        assert version.search(vectors[size:size + 1], 1)[1][0, 0] < 0.999
+
+
+def test_exact_appended_reuses_the_buffer_only_from_the_newest_index():
+    vectors = unit_rows(40, 2)
+    base = ExactIndex()
+    base.build(np.arange(10), vectors[:10])
+    first = base.appended(np.arange(10, 20), vectors[10:20])
+    second = first.appended(np.arange(20, 30), vectors[20:30])
+    assert np.shares_memory(first.vectors, second.vectors)
+    # branching off an older version must not overwrite rows the newer one uses
+    branch = first.appended(np.arange(30, 40), vectors[30:40])
+    assert not np.shares_memory(branch.vectors, second.vectors)
+    np.testing.assert_array_equal(second.ids, np.arange(30))
+    np.testing.assert_array_equal(second.vectors[20:], vectors[20:30])
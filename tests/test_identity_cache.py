@@ -0,0 +1,96 @@
+import numpy as np
+
+from video.processor import FaceProcessor
+
+FRAME_SIZE = (480, 640)
+FACE = 60
+
+
+class CountingEmbedder:
+    # Stand-in for FacenetEmbedder: the same embedding for every snip, calls counted
+    def __init__(self, embedding):
+        self.embedding = list(embedding)
+        self.calls = 0
+        self.snips = 0
+
+    def __call__(self, face_imgs, executor=None):
+        self.calls += 1
+        self.snips += len(face_imgs)
+        return [self.embedding for _ in face_imgs]
+
+
+class SceneDetector:
+    # Reports the boxes of the textured patches the scene draws
+    def __init__(self, scene):
+        self.scene = scene
+
+    def detect(self, image, min_size=None, max_size=None):
+        return np.array(self.scene.boxes, dtype=np.int32).reshape(-1, 4)
+
+
+class Scene:
+    def __init__(self, positions, seed=0):
+        rng = np.random.default_rng(seed)
+        self.patches = [rng.integers(0, 255, (FACE, FACE, 3), dtype=np.uint8) for _ in positions]
+        self.positions = list(positions)
+
+    @property
+    def boxes(self):
+        return [(x, y, FACE, FACE) for x, y in self.positions]
+
+    def frame(self):
+        frame = np.full(FRAME_SIZE + (3,), 100, dtype=np.uint8)
+        for (x, y), patch in zip(self.positions, self.patches):
+            frame[y:y + FACE, x:x + FACE] = patch
+        return frame
+
+
+def make_processor(scene, reverify_interval=30):
+    processor = FaceProcessor(tracking_mode=True, known_faces_dir=None)
+    embedding = np.ones(128, dtype=np.float32)
+    processor.embedder = CountingEmbedder(embedding)
+    processor.detector = SceneDetector(scene)
+    processor.roi_detection = False  # the scene reports full-frame boxes
+    processor.reverify_interval = reverify_interval
+    processor.set_known_faces(["alice.jpg"], [embedding])
+    return processor
+
+
+def run(processor, scene, frames):
+    for _ in range(frames):
+        processor.detect_faces(scene.frame())
+
+
+def test_static_scene_embeds_once_per_reverify_interval():
+    scene = Scene([(100, 100), (400, 200)])
+    processor = make_processor(scene, reverify_interval=30)
+    run(processor, scene, 60)
+    # frames 1 and 31, both faces in one batched call each time
+    assert processor.embedder.calls == 2
+    assert processor.embedder.snips == 4
+    assert processor.identity_cache_misses == 4
+    assert processor.identity_cache_hits == 2 * 60 - 4
+    assert all(match["identity"] == "alice.jpg" for match in processor.last_matches)
+
+
+def test_moved_track_is_reverified_before_the_interval():
+    scene = Scene([(100, 100)])
+    processor = make_processor(scene, reverify_interval=1000)
+    run(processor, scene, 10)
+    track_id = processor.tracks[0].track_id
+    assert processor.embedder.snips == 1
+    scene.positions[0] = (125, 100)  # IoU with the verified box drops to ~0.41
+    run(processor, scene, 10)
+    assert processor.tracks[0].track_id == track_id
+    assert processor.embedder.snips == 2
+
+
+def test_gallery_replacement_invalidates_cached_identities():
+    scene = Scene([(100, 100)])
+    processor = make_processor(scene, reverify_interval=1000)
+    run(processor, scene, 5)
+    assert processor.embedder.snips == 1
+    processor.set_known_faces(["bob.jpg"], [np.ones(128, dtype=np.float32)])
+    run(processor, scene, 5)
+    assert processor.embedder.snips == 2
+    assert processor.last_matches[0]["identity"] == "bob.jpg"
@@ -0,0 +1,34 @@
+import threading
+import time
+
+from video.pipeline import Pipeline
+
+
+def test_stop_waits_for_the_capture_stage_to_leave_read_frame():
+    inside = threading.Event()
+    reading = []
+
+    def read_frame():
+        reading.append(True)
+        inside.set()
+        time.sleep(0.3)  # a slow camera read
+        reading.pop()
+        return None
+
+    pipeline = Pipeline(read_frame, lambda frame: frame, lambda frame: None)
+    pipeline.start()
+    assert inside.wait(1.0)
+    pipeline.stop()
+    assert reading == []  # safe to release the camera now
+    assert not any(stage.thread.is_alive() for stage in pipeline.stages)
+
+
+def test_stop_gives_up_after_the_timeout():
+    release = threading.Event()
+    pipeline = Pipeline(lambda: release.wait(5.0) and None, lambda frame: frame, lambda frame: None)
+    pipeline.start()
+    start = time.monotonic()
+    pipeline.stop(timeout=0.2)
+    assert time.monotonic() - start < 1.0
+    assert pipeline.stages[0].thread.is_alive()
+    release.set()
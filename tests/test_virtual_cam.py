@@ -0,0 +1,102 @@
+import numpy as np
+
+from video.virtual_cam import VirtualCamSink
+
+
+class FakeDevice:
+    def __init__(self, width=320, height=240, fps=20):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.frames = []
+
+    def send(self, frame):
+        self.frames.append(frame.copy())
+
+
+class FakeTime:
+    # clock/sleep pair for VirtualCamSink: sleeping advances the clock and runs the
+    # producer for every frame it would have submitted meanwhile; stops the sink after
+    # `duration` seconds of device time
+    def __init__(self, sink_ref, producer_fps, duration):
+        self.now = 0.0
+        self.sink_ref = sink_ref
+        self.period = 1.0 / producer_fps
+        self.next_frame = 0.0
+        self.duration = duration
+        self.submitted = 0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, delay):
+        end = self.now + delay
+        while self.next_frame <= end:
+            self.submitted += 1
+            self.sink_ref[0].submit(np.full((240, 320, 3), self.submitted % 256, dtype=np.uint8))
+            self.next_frame += self.period
+        self.now = end
+        if self.now >= self.duration:
+            self.sink_ref[0]._running.clear()
+
+
+def run_paced(device_fps, producer_fps, duration=1.0):
+    device = FakeDevice(fps=device_fps)
+    ref = [None]
+    fake = FakeTime(ref, producer_fps, duration)
+    sink = VirtualCamSink(device, clock=fake.clock, sleep=fake.sleep)
+    ref[0] = sink
+    sink.submit(np.zeros((240, 320, 3), dtype=np.uint8))
+    sink._running.set()
+    sink._run()
+    return sink, device, fake
+
+
+def test_sends_at_device_fps_repeating_when_producer_is_slower():
+    sink, device, _ = run_paced(device_fps=20, producer_fps=10)
+    assert sink.sent == len(device.frames) == 20
+    # 20 ticks show the initial frame and the producer's first 10: 9 repeats
+    assert sink.repeated == 9
+    assert sink.skipped == 0
+
+
+def test_sends_at_device_fps_skipping_when_producer_is_faster():
+    sink, device, fake = run_paced(device_fps=20, producer_fps=40)
+    assert sink.sent == len(device.frames) == 20
+    assert sink.repeated == 0
+    assert fake.submitted == 40
+    # 41 frames with the initial one: 20 sent, 2 submitted after the last tick,
+    # every other one replaced before a tick could send it
+    assert sink._seq - sink._sent_seq == 2
+    assert sink.skipped == 41 - 20 - 2
+
+
+def test_tick_counts_repeats_and_skips():
+    sink = VirtualCamSink(FakeDevice(), fps=30)
+    assert sink.tick() is False  # nothing submitted yet
+    frame = np.zeros((240, 320, 3), dtype=np.uint8)
+    sink.submit(frame)
+    sink.tick()
+    sink.tick()
+    for _ in range(3):
+        sink.submit(frame)
+    sink.tick()
+    assert sink.stats() == {"fps": 30, "sent": 3, "repeated": 1, "skipped": 2}
+
+
+def test_other_sizes_are_letterboxed_to_the_device():
+    device = FakeDevice(width=320, height=240)
+    sink = VirtualCamSink(device)
+    sink.submit(np.full((100, 400, 3), 255, dtype=np.uint8))
+    sink.tick()
+    sent = device.frames[0]
+    assert sent.shape == (240, 320, 3)
+    assert sent[0].max() == 0 and sent[-1].max() == 0  # bars above and below
+    assert sent[120].min() == 255
+
+
+def test_thread_stops():
+    sink = VirtualCamSink(FakeDevice(fps=100)).start()
+    sink.submit(np.zeros((240, 320, 3), dtype=np.uint8))
+    sink.stop()
+    assert not sink._thread.is_alive()
@@ -0,0 +1,323 @@
+# video/async_stream_server.py
+# asyncio alternative to the Flask MJPEG server: one event loop for all viewers,
+# a small drop-oldest send buffer per client, and several renditions that are
+# only encoded while someone watches them.
+#   http://host:8080/                    full resolution
+#   http://host:8080/?rendition=low      smaller, lower-quality feed
+#   http://host:8080/stream/cam1         a named feed (multi-camera mode), same renditions
+#   http://host:8080/events              detection metadata as server-sent events
+#   http://host:8080/events/cam1         metadata of a named feed
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import cv2
+
+from video.events import sse_message
+from video.metrics import metrics
+from video.stream_server import broadcaster, event_streams, events, streams
+
+# name -> output width (None keeps the source size) and JPEG quality
+RENDITIONS = {
+    "full": {"width": None, "quality": 80},
+    "medium": {"width": 640, "quality": 70},
+    "low": {"width": 320, "quality": 50},
+}
+
+STREAM_HEADER = (b"HTTP/1.1 200 OK\r\n"
+                 b"Content-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                 b"Cache-Control: no-cache\r\n"
+                 b"Connection: close\r\n\r\n")
+
+EVENTS_HEADER = (b"HTTP/1.1 200 OK\r\n"
+                 b"Content-Type: text/event-stream\r\n"
+                 b"Cache-Control: no-cache\r\n"
+                 b"Connection: close\r\n\r\n")
+
+
+class _Client:
+    def __init__(self, buffer_size):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.sent = 0
+        self.skipped = 0
+
+    def offer(self, jpeg):
+        # A client whose buffer is full (slow link) loses its oldest frame, never stalls the others
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.skipped += 1
+        self.queue.put_nowait(jpeg)
+
+
+class _Rendition:
+    def __init__(self, name, width, quality, source=None):
+        self.name = name
+        self.width = width
+        self.quality = quality
+        self.source = source  # FrameBroadcaster this rendition encodes
+        self.clients = set()
+        self.task = None  # encoder task, alive only while clients is non-empty
+        self.encoded = 0
+
+
+class _EventFeed:
+    def __init__(self, source):
+        self.source = source  # MetadataBroadcaster
+        self.clients = set()
+        self.task = None  # fan-out task, alive only while clients is non-empty
+
+
+class AsyncStreamServer:
+    def __init__(self, host="0.0.0.0", port=8080, renditions=None, max_clients=32, client_buffer=2, source=broadcaster,
+                 sources=streams, events=events, event_sources=event_streams, max_event_clients=1024,
+                 event_buffer=32, keepalive=15.0):
+        self.host = host
+        self.port = port
+        self.max_clients = max_clients
+        self.client_buffer = client_buffer
+        self.source = source
+        self.sources = sources  # name -> FrameBroadcaster for /stream/<name>
+        self.rendition_options = renditions or RENDITIONS
+        self.quality_cap = 100  # set_quality(): no rendition encodes above this
+        self.renditions = {name: _Rendition(name, r["width"], r["quality"], source)
+                           for name, r in self.rendition_options.items()}
+        self._stream_renditions = {}  # (stream, rendition name) -> _Rendition, made on first viewer
+        # Metadata subscribers are cheap (a few hundred bytes per event, one shared waiting
+        # thread per feed), so they have their own, much higher limit
+        self.events = events  # /events
+        self.event_sources = event_sources  # name -> MetadataBroadcaster for /events/<name>
+        self.max_event_clients = max_event_clients
+        self.event_buffer = event_buffer
+        self.keepalive = keepalive
+        self._event_feeds = {}  # name -> _EventFeed, made on first subscriber
+        self._event_clients = 0
+        self.rejected = 0
+        self._active = 0
+        self._server = None
+        self._loop = None
+        self._started = threading.Event()
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        # Each watched rendition and event feed keeps one executor thread blocked in
+        # wait_frame/encode or wait_events; with many named feeds the default pool size
+        # would starve some of them
+        workers = self.max_clients + 2 * len(self.sources) + 8
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]  # resolves port=0
+        self._started.set()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            try:
+                await self._server.serve_forever()
+            except asyncio.CancelledError:
+                pass  # stop() closed the server
+
+    def run_in_thread(self):
+        # Starts the event loop on a daemon thread and returns once the socket is bound
+        threading.Thread(target=lambda: asyncio.run(self.serve_forever()), daemon=True).start()
+        self._started.wait()
+        return self
+
+    def stop(self):
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._server.close)
+
+    def set_quality(self, quality):
+        # Caps every rendition's JPEG quality (the quality controller degrading the
+        # output); renditions already below the cap keep their own quality
+        self.quality_cap = quality
+        for rendition in list(self.renditions.values()) + list(self._stream_renditions.values()):
+            rendition.quality = min(self.rendition_options[rendition.name]["quality"], quality)
+
+    def stats(self):
+        return {
+            "clients": self._active,
+            "rejected": self.rejected,
+            "renditions": {
+                name: {
+                    "clients": len(r.clients),
+                    "encoded": r.encoded,
+                    "skipped": sum(c.skipped for c in r.clients),
+                }
+                for name, r in self.renditions.items()
+            },
+            "streams": {
+                f"{stream}/{name}": {"clients": len(r.clients), "encoded": r.encoded}
+                for (stream, name), r in self._stream_renditions.items()
+            },
+            "events": {
+                name or "main": {"clients": len(feed.clients), **feed.source.stats()}
+                for name, feed in self._event_feeds.items()
+            },
+        }
+
+    async def _handle(self, reader, writer):
+        last_event_id = None
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), 5)
+            while (line := await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                # the only header that matters: where a reconnecting EventSource resumes
+                if line.lower().startswith(b"last-event-id:"):
+                    last_event_id = line.split(b":", 1)[1].strip().decode("latin-1")
+            _, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except (asyncio.TimeoutError, ValueError, ConnectionError):
+            writer.close()
+            return
+
+        url = urlsplit(target)
+        if url.path == "/metrics":
+            await self._reply(writer, b"200 OK", metrics.render_text().encode(), b"text/plain; version=0.0.4")
+            return
+        query = parse_qs(url.query)
+        if url.path == "/events" or url.path.startswith("/events/"):
+            since = last_event_id or query.get("since", [None])[0]
+            await self._serve_events(writer, url.path[len("/events/"):], int(since) if since and since.isdigit() else None)
+            return
+        name = query.get("rendition", ["full"])[0]
+        rendition = self._rendition(url.path, name)
+        if rendition is None:
+            await self._reply(writer, b"404 Not Found")
+            return
+        if self._active >= self.max_clients:
+            self.rejected += 1
+            await self._reply(writer, b"503 Service Unavailable")
+            return
+
+        self._active += 1
+        metrics.add_gauge("stream_clients", 1)
+        client = _Client(self.client_buffer)
+        rendition.clients.add(client)
+        if rendition.task is None:
+            rendition.task = asyncio.create_task(self._encode_loop(rendition))
+        try:
+            writer.write(STREAM_HEADER)
+            while True:
+                jpeg = await client.queue.get()
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n" % len(jpeg)
+                             + jpeg + b"\r\n")
+                await writer.drain()
+                client.sent += 1
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            rendition.clients.discard(client)
+            self._active -= 1
+            metrics.add_gauge("stream_clients", -1)
+            writer.close()
+
+    async def _serve_events(self, writer, name, since):
+        source = self.events if not name else self.event_sources.get(name)
+        if source is None:
+            await self._reply(writer, b"404 Not Found")
+            return
+        if self._event_clients >= self.max_event_clients:
+            self.rejected += 1
+            await self._reply(writer, b"503 Service Unavailable")
+            return
+
+        self._event_clients += 1
+        metrics.add_gauge("event_clients", 1)
+        feed = self._event_feeds.setdefault(name, _EventFeed(source))
+        # Registered before reading the backlog, so nothing published in between is lost;
+        # events the backlog already covered are skipped by id
+        client = _Client(self.event_buffer)
+        feed.clients.add(client)
+        if feed.task is None:
+            feed.task = asyncio.create_task(self._event_loop(feed))
+        try:
+            writer.write(EVENTS_HEADER)
+            backlog = source.events_since(since)
+            last = backlog[-1][0] if backlog else min(since or 0, source.last_id)
+            for event in backlog:
+                writer.write(sse_message(event))
+                last = event[0]
+            await writer.drain()
+            while True:
+                try:
+                    event = await asyncio.wait_for(client.queue.get(), self.keepalive)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")  # keeps proxies from closing an idle stream
+                    await writer.drain()
+                    continue
+                if event[0] <= last:
+                    continue
+                writer.write(sse_message(event))
+                await writer.drain()
+                last = event[0]
+                client.sent += 1
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            feed.clients.discard(client)
+            self._event_clients -= 1
+            metrics.add_gauge("event_clients", -1)
+            writer.close()
+
+    async def _event_loop(self, feed):
+        # One thread waits for new events per watched feed and fans them out to all of its
+        # subscribers; a slow subscriber loses its oldest events, each carries the full state
+        loop = asyncio.get_running_loop()
+        last = feed.source.last_id
+        while feed.clients:
+            pending = await loop.run_in_executor(None, feed.source.wait_events, last, 0.5)
+            for event in pending:
+                for client in list(feed.clients):
+                    client.offer(event)
+            if pending:
+                last = pending[-1][0]
+        feed.task = None
+
+    def _rendition(self, path, name):
+        if path == "/":
+            return self.renditions.get(name)
+        stream = path[len("/stream/"):] if path.startswith("/stream/") else None
+        if not stream or stream not in self.sources or name not in self.rendition_options:
+            return None
+        key = (stream, name)
+        if key not in self._stream_renditions:
+            options = self.rendition_options[name]
+            self._stream_renditions[key] = _Rendition(name, options["width"], min(options["quality"], self.quality_cap),
+                                                      self.sources[stream])
+        return self._stream_renditions[key]
+
+    async def _reply(self, writer, status, body=b"", content_type=b"text/plain"):
+        writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: " + content_type
+                     + b"\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _encode_loop(self, rendition):
+        # One encode per new frame per watched rendition, shared by all of its clients
+        loop = asyncio.get_running_loop()
+        seq = 0
+        while rendition.clients:
+            seq, frame = await loop.run_in_executor(None, rendition.source.wait_frame, seq, 0.5)
+            if frame is None:
+                continue
+            jpeg = await loop.run_in_executor(None, self._encode, frame, rendition)
+            if jpeg is None:
+                continue
+            rendition.encoded += 1
+            for client in list(rendition.clients):
+                client.offer(jpeg)
+        rendition.task = None
+
+    def _encode(self, frame, rendition):
+        with metrics.timer("stream_encode"):
+            h, w = frame.shape[:2]
+            if rendition.width and w > rendition.width:
+                frame = cv2.resize(frame, (rendition.width, int(h * rendition.width / w)), interpolation=cv2.INTER_AREA)
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, rendition.quality])
+        return buffer.tobytes() if ok else None
+
+
+def start_async_stream_server(host="0.0.0.0", port=8080, **options):
+    asyncio.run(AsyncStreamServer(host, port, **options).serve_forever())
@@ -1,12 +1,55 @@
 # video/camera.py
+import os
 import cv2
 
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class ImageFolderCapture:
+    # cv2.VideoCapture look-alike that yields the images of a directory in name order
+    def __init__(self, folder):
+        self.files = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                            if f.lower().endswith(IMAGE_EXTENSIONS))
+        self.pos = 0
+        first = cv2.imread(self.files[0]) if self.files else None
+        self.size = first.shape[1::-1] if first is not None else (0, 0)
+
+    def read(self):
+        while self.pos < len(self.files):
+            frame = cv2.imread(self.files[self.pos])
+            self.pos += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.size[0]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.size[1]
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.files)
+        return 0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        self.files = []
+
+
 class Camera:
     def __init__(self, source=0):
-        # Accept both int (local) and str (IP cam URL)
-        self.cap = cv2.VideoCapture(source)
+        # Accept int (local), str (IP cam URL or video file) and image directories
+        if isinstance(source, str) and os.path.isdir(source):
+            self.cap = ImageFolderCapture(source)
+        else:
+            self.cap = cv2.VideoCapture(source)
+        # Keep the driver queue short; the pipeline grabber drains it continuously anyway
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
         self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
 
     def get_frame(self):
         ret, frame = self.cap.read()
@@ -0,0 +1,197 @@
+# video/detectors.py
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+
+# Face detector backends. Every backend takes an image (BGR when its `color` is True,
+# gray otherwise) and returns an int32 (N, 4) array of (x, y, w, h) boxes, optionally
+# limited to faces between min_size and max_size pixels. Model files that don't ship
+# with OpenCV live under MODELS_DIR.
+MODELS_DIR = "assets/models"
+TESTSET_DIR = "assets/detector_testset"  # images + annotations.json {"img.jpg": [[x, y, w, h], ...]}
+
+
+def _size_filter(boxes, min_size, max_size):
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.int32)
+    boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    keep = np.ones(len(boxes), dtype=bool)
+    if min_size:
+        keep &= (boxes[:, 2] >= min_size[0]) & (boxes[:, 3] >= min_size[1])
+    if max_size:
+        keep &= (boxes[:, 2] <= max_size[0]) & (boxes[:, 3] <= max_size[1])
+    return boxes[keep]
+
+
+class CascadeDetector:
+    # Haar or LBP cascade (same API, LBP is faster and a little less accurate)
+    color = False
+
+    def __init__(self, path, name="haar", scale_factor=1.1, min_neighbors=5):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Cascade file not found: {path}")
+        self.name = name
+        self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade: {path}")
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, gray, min_size=None, max_size=None):
+        options = {"scaleFactor": self.scale_factor, "minNeighbors": self.min_neighbors}
+        if min_size:
+            options["minSize"] = tuple(min_size)
+        if max_size:
+            options["maxSize"] = tuple(max_size)
+        boxes = self.cascade.detectMultiScale(gray, **options)
+        return _size_filter(boxes, None, None)
+
+
+class DNNDetector:
+    # OpenCV DNN SSD face detector (res10 300x300 Caffe model by default), loaded from
+    # local files. Finds turned and partly occluded faces the cascades miss; its cost
+    # is fixed by input_size rather than by the image resolution. Trained on color
+    # images, so it is given the BGR frame.
+    color = True
+
+    def __init__(self, model, config=None, name="dnn", confidence=0.6, input_size=(300, 300),
+                 mean=(104.0, 177.0, 123.0)):
+        for path in (model, config):
+            if path and not os.path.exists(path):
+                raise FileNotFoundError(f"DNN model file not found: {path}")
+        self.name = name
+        self.net = cv2.dnn.readNet(model, config) if config else cv2.dnn.readNet(model)
+        self.confidence = confidence
+        self.input_size = input_size
+        self.mean = mean
+
+    def detect(self, image, min_size=None, max_size=None):
+        h, w = image.shape[:2]
+        bgr = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) if image.ndim == 2 else image
+        self.net.setInput(cv2.dnn.blobFromImage(bgr, 1.0, self.input_size, self.mean))
+        detections = self.net.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.confidence]
+        if len(detections) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+        corners = np.clip(detections[:, 3:7], 0, 1) * np.array([w, h, w, h], dtype=np.float32)
+        boxes = np.stack([corners[:, 0], corners[:, 1], corners[:, 2] - corners[:, 0], corners[:, 3] - corners[:, 1]], axis=1)
+        boxes = np.round(boxes).astype(np.int32)
+        return _size_filter(boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)], min_size, max_size)
+
+
+DETECTOR_BACKENDS = {
+    "haar": lambda **options: CascadeDetector(
+        cv2.data.haarcascades + "haarcascade_frontalface_default.xml", "haar", **options),
+    "lbp": lambda **options: CascadeDetector(
+        os.path.join(MODELS_DIR, "lbpcascade_frontalface_improved.xml"), "lbp", **options),
+    "dnn": lambda **options: DNNDetector(
+        os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel"),
+        os.path.join(MODELS_DIR, "deploy.prototxt"), "dnn", **options),
+}
+
+
+def make_detector(backend="haar", **options):
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Unknown face detector backend: {backend}")
+    return DETECTOR_BACKENDS[backend](**options)
+
+
+def load_testset(folder=TESTSET_DIR):
+    # [(BGR image, (N, 4) ground-truth boxes)]; empty when there is no test set
+    annotations_path = os.path.join(folder, "annotations.json")
+    if not os.path.exists(annotations_path):
+        return []
+    with open(annotations_path) as f:
+        annotations = json.load(f)
+    samples = []
+    for fname, boxes in sorted(annotations.items()):
+        img = cv2.imread(os.path.join(folder, fname), cv2.IMREAD_COLOR)
+        if img is not None:
+            samples.append((img, np.asarray(boxes, dtype=np.int32).reshape(-1, 4)))
+    return samples
+
+
+def _iou_matrix(a, b):
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1), 0.0)
+
+
+def evaluate_detector(detector, samples, iou_threshold=0.4, repeats=1):
+    # Latency (ms per image) and recall / precision at iou_threshold on annotated samples
+    # (the gray conversion of cascade input is done up front, as FaceProcessor does per frame)
+    times, found, total, correct, reported = [], 0, 0, 0, 0
+    for bgr, truth in samples:
+        image = bgr if getattr(detector, "color", False) else cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            boxes = detector.detect(image)
+            times.append((time.perf_counter() - start) * 1000)
+        total += len(truth)
+        reported += len(boxes)
+        if len(truth) and len(boxes):
+            ious = _iou_matrix(truth.astype(np.float32), boxes.astype(np.float32))
+            found += int((ious.max(axis=1) >= iou_threshold).sum())
+            correct += int((ious.max(axis=0) >= iou_threshold).sum())
+    times = np.array(times) if times else np.zeros(1)
+    return {
+        "latency_ms": round(float(np.percentile(times, 50)), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+        "recall": round(found / total, 4) if total else None,
+        "precision": round(correct / reported, 4) if reported else None,
+    }
+
+
+def benchmark_detectors(backends=None, samples=None, repeats=2, iou_threshold=0.4):
+    # Per backend: latency and accuracy, or why it is unavailable
+    samples = load_testset() if samples is None else samples
+    if not samples:
+        # No annotated set: latency only, on a synthetic 360p frame
+        rng = np.random.default_rng(0)
+        frame = cv2.GaussianBlur(rng.integers(0, 255, (360, 640, 3), dtype=np.uint8), (9, 9), 0)
+        samples = [(frame, np.zeros((0, 4), dtype=np.int32))]
+    report = {}
+    for name in backends or list(DETECTOR_BACKENDS):
+        try:
+            detector = make_detector(name)
+        except Exception as e:
+            report[name] = {"available": False, "error": str(e)}
+            continue
+        report[name] = {"available": True, **evaluate_detector(detector, samples, iou_threshold, repeats)}
+    return report
+
+
+def select_detector(min_recall=0.9, backends=None, samples=None, default="haar", repeats=2, log=print):
+    # Fastest available backend whose recall on the test set reaches min_recall; the best
+    # recall if none does; `default` when recall can't be measured. Without a test set
+    # nothing is benchmarked (the answer would be `default` anyway). Returns (backend
+    # name, report).
+    samples = load_testset() if samples is None else samples
+    if not samples:
+        log(f"No detector test set, using face detector: {default}")
+        return default, {}
+    report = benchmark_detectors(backends, samples, repeats)
+    for name, result in report.items():
+        if result["available"]:
+            log(f"Detector {name}: {result['latency_ms']:.1f} ms p50, {result['p95_ms']:.1f} ms p95, "
+                f"recall {result['recall']}, precision {result['precision']}")
+        else:
+            log(f"Detector {name}: unavailable ({result['error']})")
+    measured = {name: r for name, r in report.items() if r["available"] and r["recall"] is not None}
+    if not measured:
+        choice = default
+    else:
+        passing = [name for name, r in measured.items() if r["recall"] >= min_recall]
+        if passing:
+            choice = min(passing, key=lambda name: measured[name]["latency_ms"])
+        else:
+            choice = max(measured, key=lambda name: (measured[name]["recall"], -measured[name]["latency_ms"]))
+    log(f"Using face detector: {choice}")
+    return choice, report
@@ -0,0 +1,139 @@
+# video/embedding_store.py
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# On-disk embedding store shared by FaceProcessor and face_features_manager:
+#   <path>.f32   contiguous float32 matrix, one row per enrolled image, memory-mapped
+#   <path>.json  manifest: model name, dimension and per-row fname / mtime / hash / deleted
+# New rows are appended to the end of the matrix; deleted rows are only tombstoned in
+# the manifest until compact() rewrites the matrix without them.
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path, model_name="Facenet", compact_ratio=0.25):
+        self.matrix_path = path + ".f32"
+        self.manifest_path = path + ".json"
+        self.model_name = model_name
+        self.compact_ratio = compact_ratio  # compact once this share of rows is tombstoned
+        self.dim = None
+        self.rows = []  # manifest records, row i <-> matrix[i]
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._by_name = {}  # fname -> live row
+        self._by_hash = {}  # content hash -> a live row with that content
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path) or not os.path.exists(self.matrix_path):
+            return
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("model") != self.model_name:
+            return  # embeddings from another model are useless, start over
+        if os.path.getsize(self.matrix_path) < len(manifest["rows"]) * manifest["dim"] * 4:
+            return  # matrix shorter than the manifest says (interrupted write), start over
+        self.dim = manifest["dim"]
+        self.rows = manifest["rows"]
+        self._map()
+        self._reindex()
+
+    def _map(self):
+        if not self.rows:
+            self.matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+            return
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(len(self.rows), self.dim))
+
+    def _reindex(self):
+        self._by_name, self._by_hash = {}, {}
+        for row, record in enumerate(self.rows):
+            if not record["deleted"]:
+                self._by_name[record["fname"]] = row
+                self._by_hash.setdefault(record["hash"], row)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def lookup(self, fname, mtime):
+        # Live row for fname if it was embedded from the file with this mtime
+        row = self._by_name.get(fname)
+        if row is not None and self.rows[row]["mtime"] == mtime:
+            return row
+        return None
+
+    def row(self, fname):
+        return self._by_name.get(fname)
+
+    def lookup_hash(self, content_hash):
+        return self._by_hash.get(content_hash)
+
+    def vector(self, row):
+        return self.matrix[row]
+
+    def live(self):
+        # (row, record) for every live entry, in row order
+        return [(row, self.rows[row]) for row in sorted(self._by_name.values())]
+
+    def append(self, records, embeddings):
+        # records: dicts with fname, mtime and hash; replaces live rows with the same fname
+        embeddings = np.ascontiguousarray(np.atleast_2d(embeddings), dtype=np.float32)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+        self.delete([r["fname"] for r in records if r["fname"] in self._by_name])
+        self.matrix = None  # release the map before growing the file
+        mode = "r+b" if self.rows and os.path.exists(self.matrix_path) else "wb"
+        with open(self.matrix_path, mode) as f:
+            # anything past the last manifest row is left over from an interrupted append
+            f.seek(len(self.rows) * self.dim * 4)
+            f.truncate()
+            f.write(embeddings.tobytes())
+        first = len(self.rows)
+        for record in records:
+            self.rows.append({"fname": record["fname"], "mtime": record["mtime"], "hash": record["hash"], "deleted": False})
+        self._map()
+        self._reindex()
+        return list(range(first, len(self.rows)))
+
+    def delete(self, fnames):
+        for fname in fnames:
+            row = self._by_name.pop(fname, None)
+            if row is not None:
+                self.rows[row]["deleted"] = True
+        self._reindex()
+
+    def compact(self, force=False):
+        deleted = len(self.rows) - len(self._by_name)
+        if not deleted or (not force and deleted < self.compact_ratio * len(self.rows)):
+            return False
+        live = sorted(self._by_name.values())
+        kept = np.array(self.matrix[live], dtype=np.float32)
+        self.rows = [self.rows[row] for row in live]
+        self.matrix = None
+        tmp_path = self.matrix_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(kept.tobytes())
+        os.replace(tmp_path, self.matrix_path)
+        self._map()
+        self._reindex()
+        return True
+
+    def save(self):
+        # Manifest written atomically; the matrix is already on disk
+        if self.dim is None:
+            return
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model": self.model_name, "dim": self.dim, "rows": self.rows}, f)
+        os.replace(tmp_path, self.manifest_path)
@@ -0,0 +1,124 @@
+# video/events.py
+import json
+import threading
+import time
+from collections import deque
+
+
+def face_records(processor, faces):
+    # Per-face metadata of the last detect_faces call: box, track ID, identity and score
+    tracks = processor.tracks if processor.tracking_mode else [None] * len(faces)
+    records = []
+    for box, track, match in zip(faces, tracks, processor.last_matches):
+        records.append({
+            "box": [int(v) for v in box],
+            "track_id": track.track_id if track is not None else None,
+            "identity": match["identity"] if match and match["known"] else None,
+            "score": round(match["score"], 4) if match else None,
+        })
+    return records
+
+
+class MetadataBroadcaster:
+    # Detection metadata for consumers that don't need the video (door controllers,
+    # dashboards). The producer publishes every frame's face records; an event is only
+    # made when the scene changed (a face came or went, an identity changed, a box moved
+    # more than min_move pixels) and at most `rate` times per second: changes in between
+    # are coalesced into the newest one. Every event carries the complete face list of
+    # its frame, so a consumer that skips events is still up to date with the next one.
+    # The last `history` events stay in a ring buffer for late or reconnecting
+    # subscribers. Events are (id, JSON bytes), encoded once for all subscribers.
+    def __init__(self, rate=5.0, history=300, min_move=8, clock=time.monotonic):
+        self.rate = rate
+        self.min_move = min_move
+        self.clock = clock
+        self.frame = 0  # frames published
+        self.last_id = 0  # id of the newest event
+        self.coalesced = 0  # changed frames replaced by a newer one before being sent
+        self._history = deque(maxlen=history)
+        self._cond = threading.Condition()
+        self._state = None  # faces of the last event
+        self._pending = None  # (frame, timestamp, faces) waiting for its slot
+        self._next_at = 0.0  # earliest clock() for the next event
+
+    def publish(self, faces):
+        # Called by the producer for every frame with face_records(); cheap when nothing changed
+        with self._cond:
+            self.frame += 1
+            if not self._differs(faces, self._state):
+                self._pending = None  # back to what subscribers already have: nothing to send
+                return
+            if self._pending is not None:
+                if not self._differs(faces, self._pending[2]):
+                    self._flush(self.clock())
+                    return
+                self.coalesced += 1
+            self._pending = (self.frame, time.time(), faces)
+            self._flush(self.clock())
+
+    def _differs(self, faces, reference):
+        if reference is None or len(faces) != len(reference):
+            return True
+        for new, old in zip(faces, reference):
+            if (new["track_id"], new["identity"]) != (old["track_id"], old["identity"]):
+                return True
+            if max(abs(a - b) for a, b in zip(new["box"], old["box"])) > self.min_move:
+                return True
+        return False
+
+    def _flush(self, now):
+        # Turn the pending change into an event once its rate slot has come
+        if self._pending is None or now < self._next_at:
+            return
+        frame, timestamp, faces = self._pending
+        self._pending = None
+        self._state = faces
+        self._next_at = now + (1.0 / self.rate if self.rate else 0.0)
+        self.last_id += 1
+        record = {"id": self.last_id, "ts": round(timestamp, 3), "frame": frame, "faces": faces}
+        self._history.append((self.last_id, json.dumps(record, separators=(",", ":")).encode()))
+        self._cond.notify_all()
+
+    def _resume_after(self, last_id):
+        # Id after which a subscriber continues. An id that is unknown (None, ahead of
+        # last_id after a server restart) or already out of the ring buffer gets the
+        # subscriber treated as new: the newest event, which holds the current state.
+        oldest = self._history[0][0] if self._history else self.last_id + 1
+        if last_id is None or last_id > self.last_id or last_id < oldest - 1:
+            return self.last_id - 1 if self._history else self.last_id
+        return last_id
+
+    def events_since(self, last_id=None):
+        # Buffered events newer than last_id; a new subscriber gets just the newest
+        with self._cond:
+            self._flush(self.clock())
+            after = self._resume_after(last_id)
+            return [event for event in self._history if event[0] > after]
+
+    def wait_events(self, last_id, timeout=1.0):
+        # Blocks until there are events newer than last_id (resolved like events_since)
+        # or timeout; a pending change is turned into an event here when the producer
+        # has no new frame to do it
+        deadline = self.clock() + timeout
+        with self._cond:
+            while True:
+                now = self.clock()
+                self._flush(now)
+                after = self._resume_after(last_id)
+                if self.last_id > after:
+                    return [event for event in self._history if event[0] > after]
+                if now >= deadline:
+                    return []
+                wait = deadline - now
+                if self._pending is not None:
+                    wait = min(wait, max(self._next_at - now, 0.001))
+                self._cond.wait(wait)
+
+    def stats(self):
+        return {"frames": self.frame, "events": self.last_id, "coalesced": self.coalesced,
+                "buffered": len(self._history)}
+
+
+def sse_message(event):
+    event_id, data = event
+    return b"id: %d\ndata: %s\n\n" % (event_id, data)
@@ -0,0 +1,296 @@
+# video/gallery_index.py
+import copy
+
+import numpy as np
+
+# Both indexes store L2-normalized float32 rows, so the inner product is the
+# cosine similarity. Ids are caller-chosen ints (FaceProcessor uses the
+# position in known_faces). search() returns (ids, scores) arrays shaped
+# (queries, k), best first, padded with -1 / -inf when fewer rows exist.
+# save() stores a caller-chosen fingerprint of the gallery next to the rows;
+# load() puts it back on index.fingerprint. appended() is the add for an index
+# that is being searched concurrently: it returns a new index with the rows
+# added, copying only what the add changes, and leaves the current one intact.
+
+
+def index_file(path):
+    # np.savez appends .npz to paths without it; every save/load/exists goes through here
+    return path if path.endswith(".npz") else path + ".npz"
+
+
+def _top_k(scores, ids, k):
+    # scores: (n, m) candidate scores, ids: (m,) or (n, m) candidate ids
+    n = scores.shape[0]
+    out_ids = np.full((n, k), -1, dtype=np.int64)
+    out_scores = np.full((n, k), -np.inf, dtype=np.float32)
+    m = scores.shape[1]
+    if m == 0:
+        return out_ids, out_scores
+    kk = min(k, m)
+    top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    out_scores[:, :kk] = np.take_along_axis(top_scores, order, axis=1)
+    out_ids[:, :kk] = ids[top] if ids.ndim == 1 else np.take_along_axis(ids, top, axis=1)
+    return out_ids, out_scores
+
+
+class ExactIndex:
+    # Brute-force scan: one matrix multiply against every stored row
+    kind = "exact"
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = None
+        self.fingerprint = ""
+        # (ids, vectors, [rows used]) buffers with spare capacity that ids/vectors are views
+        # of after appended(); the row count belongs to the newest index built on them
+        self._buffer = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def build(self, ids, vectors):
+        self.ids = np.asarray(ids, dtype=np.int64).copy()
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._buffer = None
+
+    def add(self, ids, vectors):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.vectors is None:
+            self.build(ids, vectors)
+            return
+        self.remove(ids)
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.vectors = np.concatenate([self.vectors, vectors])
+
+    def appended(self, ids, vectors):
+        # ids must not be in the index yet. The new rows go into the spare capacity of the
+        # shared buffers, past the rows this index can see; the buffers are copied (and
+        # doubled) only when full or when this index is no longer the newest one on them.
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        index = ExactIndex()
+        n, k = len(self.ids), len(ids)
+        if self.vectors is None or n == 0:
+            index.build(ids, vectors)
+            return index
+        buffer = self._buffer
+        if buffer is None or buffer[2][0] != n or len(buffer[0]) < n + k:
+            capacity = max(2 * (n + k), 64)
+            buffer = (np.empty(capacity, dtype=np.int64),
+                      np.empty((capacity, self.vectors.shape[1]), dtype=np.float32), [n])
+            buffer[0][:n] = self.ids
+            buffer[1][:n] = self.vectors
+        buffer[0][n:n + k] = ids
+        buffer[1][n:n + k] = vectors
+        buffer[2][0] = n + k
+        index.ids, index.vectors, index._buffer = buffer[0][:n + k], buffer[1][:n + k], buffer
+        return index
+
+    def remove(self, ids):
+        keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+        self.ids = self.ids[keep]
+        if self.vectors is not None:
+            self.vectors = self.vectors[keep]
+        self._buffer = None
+
+    def search(self, queries, k):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if self.vectors is None or len(self.ids) == 0:
+            return _top_k(np.zeros((len(queries), 0), dtype=np.float32), self.ids, k)
+        return _top_k(queries @ self.vectors.T, self.ids, k)
+
+    def save(self, path, fingerprint=""):
+        vectors = self.vectors if self.vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        np.savez(index_file(path), kind=self.kind, ids=self.ids, vectors=vectors, fingerprint=fingerprint)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(index_file(path))
+        index = cls()
+        index.build(data["ids"], data["vectors"])
+        index.fingerprint = str(data["fingerprint"]) if "fingerprint" in data else ""
+        return index
+
+
+class IVFIndex:
+    # Inverted file index: rows are bucketed by their nearest k-means centroid and
+    # a query only scans the nprobe buckets whose centroids score highest.
+    kind = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8, iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.trained_size = 0
+        self._list_ids = []
+        self._list_vectors = []
+        self._where = {}  # id -> bucket
+        self.fingerprint = ""
+
+    def __len__(self):
+        return len(self._where)
+
+    def _train(self, vectors):
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        # k-means on a sample is plenty for bucketing
+        sample = vectors
+        if len(vectors) > 256 * nlist:
+            sample = vectors[rng.choice(len(vectors), 256 * nlist, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids /= norms
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def build(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._list_ids, self._list_vectors, self._where = [], [], {}
+        if len(vectors) == 0:
+            self.centroids = None
+            return
+        self._train(vectors)
+        dim = vectors.shape[1]
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        for c in range(len(self.centroids)):
+            mask = assign == c
+            self._list_ids.append(ids[mask])
+            self._list_vectors.append(vectors[mask].reshape(-1, dim))
+        self._where = dict(zip(ids.tolist(), assign.tolist()))
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        self.remove(ids)
+        if self.centroids is None:
+            self.build(ids, vectors)
+            return
+        if len(self) + len(ids) > 4 * self.trained_size:
+            # Buckets drift once the gallery has grown well past what k-means saw
+            all_ids, all_vectors = self._all()
+            self.build(np.concatenate([all_ids, ids]), np.concatenate([all_vectors, vectors]))
+            return
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        for c in np.unique(assign):
+            mask = assign == c
+            self._list_ids[c] = np.concatenate([self._list_ids[c], ids[mask]])
+            self._list_vectors[c] = np.concatenate([self._list_vectors[c], vectors[mask]])
+        self._where.update(zip(ids.tolist(), assign.tolist()))
+
+    def appended(self, ids, vectors):
+        # ids must not be in the index yet. The new index gets its own bucket lists with
+        # grown copies of the buckets the rows land in and shares the others; it also
+        # shares _where, which is only read by writers and they work on the newest index.
+        # Past 4x trained_size it is rebuilt and retrained instead, as add() does.
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.centroids is None or len(self) + len(ids) > 4 * self.trained_size:
+            index = IVFIndex(self.nlist, self.nprobe, self.iterations, self.seed)
+            if self.centroids is None:
+                index.build(ids, vectors)
+            else:
+                all_ids, all_vectors = self._all()
+                index.build(np.concatenate([all_ids, ids]), np.concatenate([all_vectors, vectors]))
+            return index
+        index = copy.copy(self)
+        index.fingerprint = ""
+        index._list_ids = list(self._list_ids)
+        index._list_vectors = list(self._list_vectors)
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        for c in np.unique(assign):
+            mask = assign == c
+            index._list_ids[c] = np.concatenate([self._list_ids[c], ids[mask]])
+            index._list_vectors[c] = np.concatenate([self._list_vectors[c], vectors[mask]])
+        index._where.update(zip(ids.tolist(), assign.tolist()))
+        return index
+
+    def remove(self, ids):
+        by_list = {}
+        for id_ in np.asarray(ids, dtype=np.int64).tolist():
+            c = self._where.pop(id_, None)
+            if c is not None:
+                by_list.setdefault(c, []).append(id_)
+        for c, dropped in by_list.items():
+            keep = ~np.isin(self._list_ids[c], dropped)
+            self._list_ids[c] = self._list_ids[c][keep]
+            self._list_vectors[c] = self._list_vectors[c][keep]
+
+    def _all(self):
+        if not self._list_ids:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32)
+        return np.concatenate(self._list_ids), np.concatenate(self._list_vectors)
+
+    def search(self, queries, k):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n = len(queries)
+        out_ids = np.full((n, k), -1, dtype=np.int64)
+        out_scores = np.full((n, k), -np.inf, dtype=np.float32)
+        if self.centroids is None or len(self) == 0:
+            return out_ids, out_scores
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+        for row in range(n):
+            lists = probes[row]
+            ids = np.concatenate([self._list_ids[c] for c in lists])
+            if len(ids) == 0:
+                continue
+            vectors = np.concatenate([self._list_vectors[c] for c in lists])
+            row_ids, row_scores = _top_k(queries[row:row + 1] @ vectors.T, ids, k)
+            out_ids[row], out_scores[row] = row_ids[0], row_scores[0]
+        return out_ids, out_scores
+
+    def save(self, path, fingerprint=""):
+        ids, vectors = self._all()
+        centroids = self.centroids if self.centroids is not None else np.zeros((0, 0), dtype=np.float32)
+        assign = np.array([self._where[i] for i in ids.tolist()], dtype=np.int64)
+        np.savez(index_file(path), kind=self.kind, ids=ids, vectors=vectors, centroids=centroids, assign=assign,
+                 nprobe=self.nprobe, trained_size=self.trained_size, fingerprint=fingerprint)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(index_file(path))
+        index = cls(nprobe=int(data["nprobe"]))
+        index.fingerprint = str(data["fingerprint"]) if "fingerprint" in data else ""
+        ids, vectors, assign = data["ids"], data["vectors"], data["assign"]
+        if len(data["centroids"]) == 0:
+            return index
+        index.centroids = data["centroids"]
+        index.nlist = len(index.centroids)
+        index.trained_size = int(data["trained_size"])
+        for c in range(index.nlist):
+            mask = assign == c
+            index._list_ids.append(ids[mask])
+            index._list_vectors.append(vectors[mask].reshape(-1, index.centroids.shape[1]))
+        index._where = dict(zip(ids.tolist(), assign.tolist()))
+        return index
+
+
+INDEX_BACKENDS = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def make_index(backend="exact", **options):
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown gallery index backend: {backend}")
+    return INDEX_BACKENDS[backend](**options)
+
+
+def load_index(path):
+    kind = str(np.load(index_file(path))["kind"])
+    return INDEX_BACKENDS[kind].load(path)
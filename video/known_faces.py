@@ -0,0 +1,42 @@
+# video/known_faces.py
+import os
+
+import cv2
+import numpy as np
+
+THUMBNAIL_SIZE = (100, 100)
+THUMBNAIL_QUALITY = 85
+
+
+def make_thumbnail(img, size=THUMBNAIL_SIZE):
+    # Small JPEG (a few KB) of a BGR image, None if it cannot be encoded
+    if img is None:
+        return None
+    ok, buffer = cv2.imencode(".jpg", cv2.resize(img, size, interpolation=cv2.INTER_AREA),
+                              [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+    return buffer.tobytes() if ok else None
+
+
+class KnownFace:
+    # One gallery entry. Only the embedding, a JPEG thumbnail and where the picture
+    # lives are kept in memory; the full-resolution original stays on disk and is
+    # read again only when the thumbnail has to be regenerated.
+    __slots__ = ("name", "embedding", "thumbnail", "path")
+
+    def __init__(self, name, embedding, thumbnail=None, path=None):
+        self.name = name  # filename, also the identity reported by match_embeddings
+        self.embedding = embedding  # float32 row, usually a view into a batch matrix
+        self.thumbnail = thumbnail  # JPEG bytes, or None until first needed
+        self.path = path
+
+    @property
+    def label(self):
+        return os.path.splitext(self.name)[0]
+
+    def thumbnail_image(self, size=THUMBNAIL_SIZE):
+        # Decoded BGR thumbnail, regenerated from the original on a cache miss
+        if self.thumbnail is None and self.path:
+            self.thumbnail = make_thumbnail(cv2.imread(self.path), size)
+        if self.thumbnail is None:
+            return None
+        return cv2.imdecode(np.frombuffer(self.thumbnail, dtype=np.uint8), cv2.IMREAD_COLOR)
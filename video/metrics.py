@@ -0,0 +1,134 @@
+# video/metrics.py
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+# Stage names used across the app, in pipeline order
+STAGES = ["capture", "detect", "embed", "match", "crop_resize", "display", "virtual_cam", "stream_encode"]
+
+
+class _NullTimer:
+    # Shared no-op context manager handed out while metrics are disabled
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class RollingHistogram:
+    # Last `size` samples for percentiles, a lifetime count/sum and an EWMA for display
+    def __init__(self, size=512, alpha=0.1):
+        self.samples = deque(maxlen=size)
+        self.alpha = alpha
+        self.count = 0
+        self.total = 0.0
+        self.smoothed = None
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+        self.smoothed = value if self.smoothed is None else self.alpha * value + (1 - self.alpha) * self.smoothed
+
+    def percentiles(self, qs=(50, 95, 99)):
+        if not self.samples:
+            return {q: 0.0 for q in qs}
+        values = np.percentile(np.fromiter(self.samples, dtype=np.float64), qs)
+        return dict(zip(qs, values.tolist()))
+
+
+class Metrics:
+    # Per-stage latency histograms (ms), monotonically increasing counters and gauges.
+    # With enabled False, timer() returns a shared no-op and observe/incr return at once.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+    def timer(self, stage):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, ms):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = RollingHistogram()
+            histogram.add(ms)
+
+    def incr(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def add_gauge(self, name, delta):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def smoothed(self, stage):
+        histogram = self.histograms.get(stage)
+        return histogram.smoothed if histogram and histogram.smoothed is not None else None
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                stage: {"count": h.count, "mean_ms": h.total / h.count if h.count else 0.0, "smoothed_ms": h.smoothed,
+                        **{f"p{q}_ms": v for q, v in h.percentiles().items()}}
+                for stage, h in self.histograms.items()
+            }
+            return {"stages": stages, "counters": dict(self.counters), "gauges": dict(self.gauges)}
+
+    def render_text(self):
+        # Prometheus text exposition format
+        snap = self.snapshot()
+        lines = ["# TYPE facetracker_stage_latency_ms summary"]
+        for stage, s in snap["stages"].items():
+            for q in (50, 95, 99):
+                lines.append(f'facetracker_stage_latency_ms{{stage="{stage}",quantile="{q / 100:g}"}} {s[f"p{q}_ms"]:.4f}')
+            lines.append(f'facetracker_stage_latency_ms_count{{stage="{stage}"}} {s["count"]}')
+            lines.append(f'facetracker_stage_latency_ms_sum{{stage="{stage}"}} {s["mean_ms"] * s["count"]:.4f}')
+        for name, value in sorted(snap["counters"].items()):
+            lines.append(f"# TYPE facetracker_{name}_total counter")
+            lines.append(f"facetracker_{name}_total {value}")
+        for name, value in sorted(snap["gauges"].items()):
+            lines.append(f"# TYPE facetracker_{name} gauge")
+            lines.append(f"facetracker_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide instance; the GUI turns it on, headless tools may leave it off
+metrics = Metrics()
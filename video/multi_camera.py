@@ -0,0 +1,240 @@
+# video/multi_camera.py
+# Multi-source mode: many cameras, one recognition model. Every CameraStream has its
+# own grabber, detector/tracker and output feed; face snips from all streams go
+# through a single RecognitionEngine that embeds and matches them in shared batches.
+import re
+import threading
+import time
+from collections import deque
+
+from video.camera import Camera
+from video.events import face_records
+from video.metrics import metrics
+from video.pipeline import Pipeline
+from video.stream_server import register_events, register_stream
+from video.utils import FrameCropper
+
+
+class _Request:
+    __slots__ = ("stream", "snips", "results", "done", "submitted")
+
+    def __init__(self, stream, snips):
+        self.stream = stream
+        self.snips = snips
+        self.results = None
+        self.done = threading.Event()
+        self.submitted = time.perf_counter()
+
+
+class RecognitionEngine:
+    # Embeds and matches face snips for several streams against the gallery of one
+    # FaceProcessor. Requests wait in one queue per stream; each batch takes requests
+    # round-robin across the streams (starting after the stream served first last
+    # time) until max_batch snips, so a busy stream cannot starve the others. A batch
+    # is sent after at most max_wait_ms of waiting for other streams to join it.
+    def __init__(self, processor, max_batch=32, max_wait_ms=5.0):
+        self.processor = processor
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.batches = 0
+        self.served = {}  # stream -> snips embedded
+        self._queues = {}  # stream -> deque of _Request
+        self._order = []  # round-robin order of streams
+        self._turn = 0
+        self._cond = threading.Condition()
+        self._running = threading.Event()
+        self._thread = None
+
+    def client(self, stream):
+        # callable(face_snips) -> matches for FaceProcessor.recognizer
+        with self._cond:
+            if stream not in self._queues:
+                self._queues[stream] = deque()
+                self._order.append(stream)
+                self.served[stream] = 0
+        return lambda snips: self.identify(stream, snips)
+
+    def identify(self, stream, snips, timeout=5.0):
+        if not snips:
+            return []
+        request = _Request(stream, list(snips))
+        with self._cond:
+            self._queues[stream].append(request)
+            self._cond.notify()
+        if not request.done.wait(timeout) or request.results is None:
+            return [None] * len(snips)  # engine stopped or overloaded, treat as unidentified
+        return request.results
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="recognition-engine", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running.clear()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _pending(self):
+        return sum(len(self._queues[stream]) for stream in self._order)
+
+    def _take_batch(self):
+        # Round-robin, one request per stream per round, until the batch is full
+        batch, count = [], 0
+        streams = self._order[self._turn:] + self._order[:self._turn]
+        self._turn = (self._turn + 1) % max(1, len(self._order))
+        while count < self.max_batch:
+            took = False
+            for stream in streams:
+                queue = self._queues[stream]
+                if queue and (not batch or count + len(queue[0].snips) <= self.max_batch):
+                    request = queue.popleft()
+                    batch.append(request)
+                    count += len(request.snips)
+                    took = True
+            if not took:
+                break
+        return batch
+
+    def _run(self):
+        while self._running.is_set():
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending() or not self._running.is_set(), 0.5)
+                if not self._pending():
+                    continue
+                if self._pending() < len(self._order):
+                    # give the other streams a moment to add their faces to this batch
+                    self._cond.wait_for(lambda: self._pending() >= len(self._order), self.max_wait_ms / 1000)
+                batch = self._take_batch()
+            self._process(batch)
+
+    def _process(self, batch):
+        snips = [snip for request in batch for snip in request.snips]
+        try:
+            matches = self.processor.match_embeddings(self.processor._get_embeddings(snips))
+        except Exception as e:
+            print(f"Recognition engine error: {e}")
+            matches = [None] * len(snips)
+        self.batches += 1
+        metrics.set_gauge("engine_batch_size", len(snips))
+        start = 0
+        for request in batch:
+            request.results = matches[start:start + len(request.snips)]
+            start += len(request.snips)
+            self.served[request.stream] += len(request.snips)
+            metrics.observe(f"engine_wait_{request.stream}", (time.perf_counter() - request.submitted) * 1000)
+            request.done.set()
+
+
+def stream_name(source, index):
+    # Short, URL and metric friendly name for a camera source
+    name = source if isinstance(source, str) else f"cam{source}"
+    name = re.sub(r"\W+", "_", str(name).rsplit("/", 1)[-1]).strip("_")
+    return f"{index}_{name}" if name else f"cam{index}"
+
+
+class CameraStream:
+    # One camera: grabber -> detect/track (+ shared recognition) -> crop -> own feed.
+    # Frames carry their grab time so the stream's end-to-end latency can be measured.
+    # Detection metadata goes to the stream's own event feed, at most event_rate per second.
+    def __init__(self, name, source, engine, ratio="16:9", height=540, processor_options=None, event_rate=5.0):
+        from video.processor import FaceProcessor
+        self.name = name
+        self.source = source
+        self.engine = engine
+        self.camera = Camera(source=source)
+        self.processor = FaceProcessor(tracking_mode=True, known_faces_dir=None, **(processor_options or {}))
+        self.processor.recognizer = engine.client(name)
+        self.cropper = FrameCropper(ratio, height=height)
+        self.broadcaster = register_stream(name)
+        self.events = register_events(name, event_rate)
+        self.track_name = None
+        self.frames = 0
+        self.fps = 0.0
+        self.latency_ms = 0.0
+        self._last_output = None
+        self.pipeline = Pipeline(self._grab, self._process, self._publish)
+
+    def track(self, name):
+        # Crop this stream's output to a known face (filename), None for the full frame
+        self.track_name = name
+        self.processor.set_tracked_index(None)
+
+    def _grab(self):
+        frame = self.camera.get_frame()
+        return None if frame is None else (time.perf_counter(), frame)
+
+    def _process(self, item):
+        grabbed, frame = item
+        shared = self.engine.processor
+        # Cached identities are checked against the shared gallery's changes
+        self.processor.gallery_version = shared.gallery_version
+        self.processor._gallery_replaced_at = shared._gallery_replaced_at
+        if self.track_name is not None:
+            names = shared.known_names
+            index = names.index(self.track_name) if self.track_name in names else None
+            if index != self.processor.tracked_index:
+                self.processor.set_tracked_index(index)
+        faces, _ = self.processor.detect_faces(frame)
+        self.events.publish(face_records(self.processor, faces))
+        return grabbed, self.cropper(frame, self.processor.get_tracked_box(faces))
+
+    def _publish(self, item):
+        grabbed, output = item
+        self.broadcaster.publish(output)
+        now = time.perf_counter()
+        self.latency_ms = (now - grabbed) * 1000
+        if self._last_output is not None:
+            fps = 1.0 / max(now - self._last_output, 1e-6)
+            self.fps = fps if not self.fps else 0.9 * self.fps + 0.1 * fps
+        self._last_output = now
+        self.frames += 1
+        metrics.observe(f"stream_{self.name}", self.latency_ms)
+        metrics.set_gauge(f"stream_{self.name}_fps", round(self.fps, 2))
+
+    def start(self):
+        self.pipeline.start()
+
+    def stop(self):
+        self.pipeline.stop()
+        self.camera.release()
+        self.broadcaster.publish(None)
+
+    def stats(self):
+        stages = self.pipeline.stats()
+        return {
+            "frames": self.frames,
+            "fps": round(self.fps, 2),
+            "latency_ms": round(self.latency_ms, 2),
+            "dropped": sum(entry.get("dropped", 0) for entry in stages.values()),
+            "faces_identified": self.engine.served.get(self.name, 0),
+            "tracks": len(self.processor.tracks),
+            "events": self.events.last_id,
+        }
+
+
+class MultiCameraMonitor:
+    # All streams of a multi-camera session plus the engine and gallery they share.
+    # processor: the FaceProcessor holding the gallery (and the only model copy).
+    def __init__(self, processor, sources, ratio="16:9", height=540, max_batch=32, processor_options=None,
+                 event_rate=5.0):
+        self.processor = processor
+        self.engine = RecognitionEngine(processor, max_batch=max_batch)
+        self.streams = [CameraStream(stream_name(source, i), source, self.engine, ratio, height, processor_options,
+                                     event_rate)
+                        for i, source in enumerate(sources)]
+
+    def start(self):
+        self.engine.start()
+        for stream in self.streams:
+            stream.start()
+        return self
+
+    def stop(self):
+        for stream in self.streams:
+            stream.stop()
+        self.engine.stop()
+
+    def stats(self):
+        return {stream.name: stream.stats() for stream in self.streams}
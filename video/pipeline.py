@@ -0,0 +1,141 @@
+# video/pipeline.py
+import threading
+import time
+from collections import deque
+
+from video.metrics import metrics
+
+
+class DropOldestQueue:
+    # Bounded hand-off between two stages: putting into a full queue discards the
+    # oldest item, so a slow consumer always works on the newest frame
+    def __init__(self, maxsize=1, name="queue"):
+        self.maxsize = maxsize
+        self.name = name
+        self.put_count = 0
+        self.dropped = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+                metrics.incr(f"frames_dropped_{self.name}")
+            self._items.append(item)
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # Returns None on timeout or once the queue is closed and empty
+        with self._cond:
+            self._cond.wait_for(lambda: self._items or self.closed, timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class Stage:
+    # A worker thread: take from inbox, run func, put the result into outbox
+    def __init__(self, name, func, inbox=None, outbox=None):
+        self.name = name
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.processed = 0
+        self.errors = 0
+        self.last_ms = 0.0
+        self.thread = None
+
+    def start(self, running):
+        self.thread = threading.Thread(target=self._run, args=(running,), name=f"pipeline-{self.name}", daemon=True)
+        self.thread.start()
+
+    def _run(self, running):
+        while running.is_set():
+            if self.inbox is None:
+                try:
+                    item = self.func()  # source stage
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Pipeline {self.name} error: {e}")
+                    time.sleep(0.1)  # a failing camera read, don't spin on it
+                    continue
+            else:
+                item = self.inbox.get(timeout=0.5)
+                if item is None:
+                    continue
+                start = time.perf_counter()
+                try:
+                    item = self.func(item)
+                except Exception as e:
+                    self.errors += 1
+                    print(f"Pipeline {self.name} error: {e}")
+                    continue
+                self.last_ms = (time.perf_counter() - start) * 1000
+            if item is None:
+                continue
+            self.processed += 1
+            if self.outbox is not None:
+                self.outbox.put(item)
+
+
+class Pipeline:
+    # capture -> process -> render, each on its own thread with a drop-oldest queue
+    # between them. The grabber reads the camera as fast as it delivers, so OpenCV's
+    # internal buffer never hands out stale frames, and end-to-end latency is bounded
+    # by the slowest stage instead of the sum of all stages.
+    def __init__(self, read_frame, process, render, queue_size=1):
+        self.read_frame = read_frame
+        self.capture_queue = DropOldestQueue(queue_size, "process")
+        self.render_queue = DropOldestQueue(queue_size, "render")
+        self.stages = [
+            Stage("capture", self._grab, outbox=self.capture_queue),
+            Stage("process", process, self.capture_queue, self.render_queue),
+            Stage("render", render, self.render_queue),
+        ]
+        self._running = threading.Event()
+
+    def _grab(self):
+        frame = self.read_frame()
+        if frame is None:
+            time.sleep(0.01)  # no camera or end of stream, don't spin
+        return frame
+
+    def start(self):
+        self._running.set()
+        for stage in self.stages:
+            stage.start(self._running)
+
+    def stop(self, timeout=2.0):
+        # Signals the stages and waits (up to timeout in all) for their threads to end,
+        # so the caller can release the camera once the capture stage is out of read_frame
+        self._running.clear()
+        self.capture_queue.close()
+        self.render_queue.close()
+        deadline = time.monotonic() + timeout
+        for stage in self.stages:
+            if stage.thread is not None and stage.thread is not threading.current_thread():
+                stage.thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        # Per stage: frames handled, last processing time, and the depth / drop
+        # counters of the queue feeding it
+        stats = {}
+        for stage in self.stages:
+            entry = {"processed": stage.processed, "errors": stage.errors, "last_ms": stage.last_ms}
+            if stage.inbox is not None:
+                entry["depth"] = len(stage.inbox)
+                entry["dropped"] = stage.inbox.dropped
+            stats[stage.name] = entry
+        return stats
@@ -1,102 +1,525 @@
 import cv2
+import hashlib
 import numpy as np
 import os
-import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from video.detectors import make_detector, select_detector
+from video.embedding_store import EmbeddingStore
+from video.gallery_index import index_file, make_index, load_index
+from video.known_faces import KnownFace, make_thumbnail
+from video.metrics import metrics
+
+
+def _iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+# DeepFace.extract_faces runs on one OpenCV detector cached for the whole process, which
+# is not thread-safe, so the embedders find the face inside a snip themselves with the
+# same cascades, one pair per thread (live frames and enrollment workers never share one)
+_snip_cascades = threading.local()
+
+
+def _cascades():
+    if not hasattr(_snip_cascades, "face"):
+        _snip_cascades.face = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        _snip_cascades.eye = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_eye.xml")
+    return _snip_cascades.face, _snip_cascades.eye
+
+
+def _align_eyes(face, eye_cascade):
+    # Rotate so the two largest eye detections are level; unchanged if fewer are found
+    eyes = eye_cascade.detectMultiScale(cv2.cvtColor(face, cv2.COLOR_RGB2GRAY), 1.1, 10)
+    if len(eyes) < 2:
+        return face
+    eyes = sorted(eyes, key=lambda e: e[2] * e[3], reverse=True)[:2]
+    (lx, ly), (rx, ry) = sorted((x + w / 2, y + h / 2) for x, y, w, h in eyes)
+    h, w = face.shape[:2]
+    rotation = cv2.getRotationMatrix2D((w / 2, h / 2), float(np.degrees(np.arctan2(ry - ly, rx - lx))), 1.0)
+    return cv2.warpAffine(face, rotation, (w, h))
+
+
+def _extract_face(face_rgb):
+    # What DeepFace.extract_faces(detector_backend="opencv", align=True,
+    # enforce_detection=False) returns: the largest face in the RGB snip (the whole snip
+    # if none), eye-aligned, as float RGB in [0, 1]
+    face_cascade, eye_cascade = _cascades()
+    faces = face_cascade.detectMultiScale(cv2.cvtColor(face_rgb, cv2.COLOR_RGB2GRAY), 1.1, 10)
+    face = face_rgb
+    if len(faces):
+        x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+        face = _align_eyes(face_rgb[y:y + h, x:x + w], eye_cascade)
+    return face.astype(np.float32) / 255
+
+
+def _read_image(folder, fname):
+    # Decoded BGR image (None if unreadable), its thumbnail and the sha1 of the file
+    # bytes (same as file_hash())
+    data = np.fromfile(os.path.join(folder, fname), dtype=np.uint8)
+    img = cv2.imdecode(data, cv2.IMREAD_COLOR) if data.size else None
+    return img, make_thumbnail(img), hashlib.sha1(data.tobytes()).hexdigest()
+
+
+class Track:
+    # One face followed across frames; track_id never changes while the face is visible
+    def __init__(self, track_id, box, template):
+        self.track_id = track_id
+        self.box = box  # (x, y, w, h) ints in frame coordinates
+        self.template = template  # gray patch from the last full detection
+        self.confidence = 1.0  # 1.0 on a detection frame, template match score in between
+        self.misses = 0  # consecutive detection passes without a matching box
+        self.match = None  # cached identity result from match_embeddings
+        self.verified_frame = None  # frame index of the last embedding of this track
+        self.verified_box = None  # box the cached identity was computed on
+        self.verified_gallery = None  # gallery_version the cached identity was matched against
+
+
+class FacenetEmbedder:
+    # Embeds a list of BGR face snips with a single Facenet forward pass,
+    # reusing one preallocated input tensor across calls
+    def __init__(self, face_size=(160, 160)):
+        self.face_size = face_size
+        self._model = None
+        self._batch = np.empty((0, face_size[1], face_size[0], 3), dtype=np.float32)
+
+    def _get_model(self):
+        if self._model is None:
+            from deepface import DeepFace  # moved import here
+            self._model = DeepFace.build_model("Facenet")
+        return self._model
+
+    def _batch_buffer(self, count):
+        # Grow the preallocated input tensor only when a frame has more faces than ever before
+        if self._batch.shape[0] < count:
+            capacity = max(count, 2 * self._batch.shape[0], 4)
+            self._batch = np.empty((capacity,) + self._batch.shape[1:], dtype=np.float32)
+        return self._batch
+
+    def _prepare_face(self, face_img, out):
+        # Same preprocessing DeepFace.represent applies per call (detect/align inside the
+        # snip, then pad-resize to the model input), written into a slot of the batch tensor
+        from deepface.modules import preprocessing
+        face_rgb = cv2.cvtColor(cv2.resize(face_img, self.face_size), cv2.COLOR_BGR2RGB)
+        face = _extract_face(face_rgb)[:, :, ::-1]
+        out[...] = preprocessing.resize_image(face, target_size=(self.face_size[1], self.face_size[0]))[0]
+
+    def _try_prepare(self, face_img, out):
+        try:
+            self._prepare_face(face_img, out)
+            return True
+        except Exception:
+            return False
+
+    def __call__(self, face_imgs, executor=None):
+        # One embedding (list of floats) or None per snip, in input order. With an
+        # executor the per-snip preprocessing, face detection inside the snip included,
+        # runs on its threads (OpenCV releases the GIL).
+        embeddings = [None] * len(face_imgs)
+        try:
+            model = self._get_model()
+        except Exception:
+            return embeddings
+        batch = self._batch_buffer(len(face_imgs))
+        if executor is not None:
+            prepared = list(executor.map(self._try_prepare, face_imgs, batch[:len(face_imgs)]))
+        else:
+            prepared = [self._try_prepare(face_img, batch[idx]) for idx, face_img in enumerate(face_imgs)]
+        rows = [idx for idx, ok in enumerate(prepared) if ok]  # indices of faces that made it into the batch
+        if not rows:
+            return embeddings
+        if len(rows) < len(face_imgs):
+            batch[:len(rows)] = batch[rows]  # close the gaps left by failed snips
+        try:
+            output = model.model(batch[:len(rows)], training=False).numpy()
+        except Exception:
+            return embeddings
+        for row, idx in enumerate(rows):
+            embeddings[idx] = output[row].tolist()
+        return embeddings
+
 
 class FaceProcessor:
-    def __init__(self):
-        cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
-        self.known_faces = []  # list of (face image, embedding)
-        self.known_names = []  # optional: store filenames or labels
+    def __init__(self, index_backend="exact", index_options=None, index_path=None, tracking_mode=False,
+                 recognition_workers=0, known_faces_dir="assets/known_faces_pics", detector="haar",
+                 detector_min_recall=0.9):
+        # detector: a backend name from DETECTOR_BACKENDS, or "auto" to benchmark them on
+        # the detector test set and take the fastest one reaching detector_min_recall
+        if detector == "auto":
+            detector, self.detector_report = select_detector(detector_min_recall)
+        else:
+            self.detector_report = None
+        self.detector = make_detector(detector)
+        self.known_faces = []  # KnownFace records: embedding, thumbnail, path (no full images)
+        self.known_names = []  # filenames, same order as known_faces
         self.tracked_index = None
         self.smoothed_box = None
-        self.cache_path = "assets/known_faces.pkl"
+        self.store_path = "assets/known_faces_store"  # .f32 matrix + .json manifest
         self.tracking_margin = 1.5
-        self._load_known_faces("assets/known_faces_pics")
-
-    def _load_known_faces(self, folder):
-        from deepface import DeepFace  # moved import here
-        # Load cache if exists
-        cache = {}
-        if os.path.exists(self.cache_path):
-            with open(self.cache_path, "rb") as f:
-                cache = pickle.load(f)
-        updated_cache = {}
-        for fname in os.listdir(folder):
-            fpath = os.path.join(folder, fname)
-            if not (fname.lower().endswith(".jpg") or fname.lower().endswith(".png")):
-                continue
-            img = cv2.imread(fpath)
-            if img is None:
-                continue
-            mtime = os.path.getmtime(fpath)
-            cache_key = (fname, mtime)
-            if cache_key in cache:
-                embedding = cache[cache_key]["embedding"]
-                self.known_faces.append((img, embedding))
-                self.known_names.append(fname)
-                updated_cache[cache_key] = cache[cache_key]
+        self.face_size = (160, 160)
+        self.embedder = FacenetEmbedder(self.face_size)
+        # recognition_workers > 0 moves embedding into worker processes, each with a warm model
+        self.recognition_pool = None
+        if recognition_workers:
+            from video.recognition_pool import RecognitionPool
+            self.recognition_pool = RecognitionPool(recognition_workers, face_size=self.face_size)
+        self.match_threshold = 0.7  # cosine similarity, can be tuned
+        self.top_k = 3
+        # Gallery search structure over L2-normalized embeddings, ids are known_faces positions.
+        # "exact" scans everything, "ivf" only the closest k-means buckets (large galleries).
+        self.index_backend = index_backend
+        self.index_options = index_options or {}
+        self.index_path = index_path
+        self.index = make_index(index_backend, **self.index_options)
+        # known_faces / known_names / index are replaced or grown under this lock while the
+        # pipeline keeps matching; gallery_version counts changes so cached identities can
+        # be re-checked against entries enrolled after them
+        self._gallery_lock = threading.Lock()
+        # Serializes the writers (enrollment, reload), which prepare the next gallery and
+        # index outside _gallery_lock and only take it for the swap
+        self._gallery_write_lock = threading.Lock()
+        self.gallery_version = 0
+        self._gallery_replaced_at = 0  # gallery_version of the last change that renumbered entries
+        self.known_faces_dir = known_faces_dir
+        self.enroll_batch_size = 16
+        self.enroll_workers = 4
+        # The store is checkpointed (full manifest rewrite) at most this often during enrollment
+        self.enroll_checkpoint_interval = 30.0
+        self.last_matches = []
+        # Optional callable(face_snips) -> matches that replaces the local embed + match,
+        # e.g. a RecognitionEngine client shared by several camera streams
+        self.recognizer = None
+        # Tracking mode: full Haar detection every detect_interval frames (or when a
+        # track's template match falls below min_track_confidence), template matching
+        # in a small window around each box in between
+        self.tracking_mode = tracking_mode
+        self.detect_interval = 5
+        self.min_track_confidence = 0.5
+        self.track_search_margin = 0.5  # search window grows by this fraction of the box per side
+        self.max_track_misses = 2
+        self.min_track_iou = 0.3
+        self.tracks = []
+        self.tracked_track_id = None
+        self._next_track_id = 0
+        self._frames_since_detect = 0
+        # Detection cost: the detector runs on a detect_scale-downscaled gray image and only
+        # looks for faces between min_face_size and max_face_size (full-res pixels). While
+        # tracking, detection passes only search around existing tracks (roi_detection),
+        # with a full-frame sweep at least every full_sweep_interval frames for new faces.
+        self.detect_scale = 1.0
+        self.min_face_size = None
+        self.max_face_size = None
+        self.roi_detection = True
+        self.roi_margin = 1.0
+        self.full_sweep_interval = 15
+        self._frames_since_sweep = 0
+        # Per-track identity cache: re-embed a track every reverify_interval frames, when its
+        # box IoU against the verified box drops below reverify_iou, or while its score sits
+        # within reverify_margin of match_threshold. Entries go away with their track.
+        self.reverify_interval = 30
+        self.reverify_iou = 0.5
+        self.reverify_margin = 0.05
+        self.identity_cache_hits = 0
+        self.identity_cache_misses = 0
+        self._frame_index = 0
+        if known_faces_dir:
+            self.enroll_known_faces(known_faces_dir)
+
+    def set_known_faces(self, names, embeddings, images=None, reuse_index=False):
+        # Replace the whole gallery (e.g. with precomputed or synthetic embeddings).
+        # images, if given, are only used to make the thumbnails.
+        self._replace_gallery(self._records(names, embeddings, images), reuse_index)
+
+    def add_known_faces(self, names, embeddings, images=None):
+        # Append entries to the gallery and its index; returns the position of the first one
+        return self._append_gallery(self._records(names, embeddings, images))
+
+    def _records(self, names, embeddings, images=None, thumbnails=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if thumbnails is None:
+            thumbnails = [make_thumbnail(img) for img in images] if images is not None else [None] * len(names)
+        folder = self.known_faces_dir
+        return [KnownFace(name, embeddings[i], thumbnails[i], os.path.join(folder, name) if folder else None)
+                for i, name in enumerate(names)]
+
+    def _replace_gallery(self, faces, reuse_index=False):
+        # The new index is built before taking the lock, so matching never waits on it or
+        # sees a half-built gallery; a selected face stays selected if its name survives
+        names = [face.name for face in faces]
+        with self._gallery_write_lock:
+            index = self._build_index(faces, reuse_index)
+            with self._gallery_lock:
+                selected = None
+                if self.tracking_mode and self.tracked_index is not None and self.tracked_index < len(self.known_names):
+                    selected = self.known_names[self.tracked_index]
+                self.known_faces = faces
+                self.known_names = names
+                self.index = index
+                self.gallery_version += 1
+                self._gallery_replaced_at = self.gallery_version
+                if selected is not None:
+                    self.tracked_index = names.index(selected) if selected in names else None
+
+    def _append_gallery(self, faces):
+        # The entries go into a new index that shares the unchanged rows with the current
+        # one (see appended()), so matching keeps using the current one until the swap
+        vectors = self._normalize([face.embedding for face in faces])
+        with self._gallery_write_lock:
+            first = len(self.known_faces)
+            index = self.index.appended(np.arange(first, first + len(faces)), vectors)
+            with self._gallery_lock:
+                # new lists rather than extend(), so a reader holding the old ones sees a consistent pair
+                self.known_faces = self.known_faces + faces
+                self.known_names = self.known_names + [face.name for face in faces]
+                self.index = index
+                self.gallery_version += 1
+        return first
+
+    def enroll_known_faces(self, folder, on_added=None):
+        # Progressive enrollment. Images whose embedding is already in the store are
+        # published first, all at once and without decoding them (thumbnails are made
+        # when first shown); the others are decoded, preprocessed and embedded
+        # enroll_batch_size at a time on a thread pool (the next batch decodes while the
+        # current one runs through the model) and published batch by batch. Matching works
+        # on the partial gallery throughout. on_added(first, faces) is called from this
+        # thread after each publish.
+        self.known_faces_dir = folder
+        store = EmbeddingStore(self.store_path, model_name="Facenet")
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith((".jpg", ".png")))
+        cached, missing = [], []
+        for fname in files:
+            mtime = os.path.getmtime(os.path.join(folder, fname))
+            row = store.lookup(fname, mtime)
+            if row is None:
+                missing.append((fname, mtime))
             else:
-                face_img = cv2.cvtColor(self._resize_face(img), cv2.COLOR_BGR2RGB)
-                try:
-                    embedding_objs = DeepFace.represent(face_img, model_name="Facenet", enforce_detection=False)
-                    if isinstance(embedding_objs, list) and len(embedding_objs) > 0:
-                        embedding = embedding_objs[0]["embedding"]
-                        self.known_faces.append((img, embedding))
-                        self.known_names.append(fname)
-                        updated_cache[cache_key] = {"embedding": embedding}
-                except Exception:
+                cached.append((fname, row))
+        if cached:
+            # one vectorized copy out of the map
+            gallery = np.array(store.matrix[[row for _, row in cached]], dtype=np.float32)
+            self._publish(self._records([fname for fname, _ in cached], gallery), on_added)
+
+        embedder = FacenetEmbedder(self.face_size)  # own input buffer, self.embedder serves live frames
+        last_checkpoint = time.monotonic()
+        enrolled = False
+        with ThreadPoolExecutor(max_workers=self.enroll_workers) as pool:
+            size = self.enroll_batch_size
+            pending = [pool.submit(_read_image, folder, fname) for fname, _ in missing[:size]]
+            for start in range(0, len(missing), size):
+                batch = missing[start:start + size]
+                decoded = [future.result() for future in pending]
+                pending = [pool.submit(_read_image, folder, fname) for fname, _ in missing[start + size:start + 2 * size]]
+
+                records, images, thumbnails, embeddings, to_embed = [], [], [], [], []
+                for (fname, mtime), (img, thumbnail, content_hash) in zip(batch, decoded):
+                    if img is None:
+                        continue
+                    row = store.lookup_hash(content_hash)  # same picture under another name or touched
+                    records.append({"fname": fname, "mtime": mtime, "hash": content_hash})
+                    images.append(img)
+                    thumbnails.append(thumbnail)
+                    embeddings.append(np.array(store.vector(row)) if row is not None else None)
+                    if row is None:
+                        to_embed.append(len(embeddings) - 1)
+                for idx, embedding in zip(to_embed, embedder([images[i] for i in to_embed], executor=pool)):
+                    embeddings[idx] = embedding
+                del images  # full-resolution pixels are not kept past embedding
+                keep = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+                if not keep:
                     continue
-        # Save updated cache
-        with open(self.cache_path, "wb") as f:
-            pickle.dump(updated_cache, f)
+                gallery = np.array([embeddings[i] for i in keep], dtype=np.float32)
+                store.append([records[i] for i in keep], gallery)
+                enrolled = True
+                if time.monotonic() - last_checkpoint >= self.enroll_checkpoint_interval:
+                    store.save()  # an interrupted enrollment resumes from here
+                    last_checkpoint = time.monotonic()
+                self._publish(self._records([records[i]["fname"] for i in keep], gallery,
+                                            thumbnails=[thumbnails[i] for i in keep]), on_added)
+
+        present = set(files)
+        stale = [record["fname"] for _, record in store.live() if record["fname"] not in present]
+        if not enrolled and not stale:
+            return  # store unchanged; the index was reused or saved by _build_index
+        store.delete(stale)
+        store.compact()
+        store.save()
+        if self.index_path and self.known_faces:
+            with self._gallery_write_lock:  # no swap while saving, matching goes on
+                self.index.save(self.index_path, self._gallery_fingerprint(self.known_faces))
+
+    def _publish(self, faces, on_added):
+        if not self.known_faces:
+            self._replace_gallery(faces, reuse_index=True)
+            first = 0
+        else:
+            first = self._append_gallery(faces)
+        if on_added:
+            on_added(first, faces)
+
+    def reload_known_faces(self, changed, removed, store=None):
+        # Apply a diff of the known faces folder whose embeddings are already in the store
+        # (see face_features_manager): keeps the current order, drops removed names, takes
+        # changed ones from the store and appends new ones. Unchanged entries keep their
+        # record and thumbnail; nothing is decoded here. Runs on the caller's thread.
+        store = store or EmbeddingStore(self.store_path, model_name="Facenet")
+        changed, removed = set(changed), set(removed)
+        current = {face.name: face for face in self.known_faces}
+        names = [name for name in self.known_names if name not in removed]
+        names += sorted(changed - set(names))
+        names = [name for name in names if store.row(name) is not None]
+        fresh = [name for name in names if name in changed or name not in current]
+        rows = [store.row(name) for name in fresh]
+        gallery = np.array(store.matrix[rows], dtype=np.float32) if rows else np.zeros((0, store.dim or 0), dtype=np.float32)
+        current.update(zip(fresh, self._records(fresh, gallery)))
+        self._replace_gallery([current[name] for name in names])
 
     def detect_faces(self, frame):
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+        with metrics.timer("detect"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if self.tracking_mode:
+                tracks = self.update_tracks(gray, frame)
+                faces = np.array([t.box for t in tracks], dtype=np.int32).reshape(-1, 4)
+            else:
+                faces = self.detect_boxes(gray, frame=frame)
 
+        if self.tracking_mode:
+            self.last_matches = self._identify_tracks(frame)
+        else:
+            self.last_matches = self.identify_faces(frame, faces)
         detected_known_faces = []
-        for (x, y, w, h) in faces:
-            face_snip = frame[y:y + h, x:x + w]
-            if self._is_known(face_snip):
-                detected_known_faces.append(face_snip)
+        for (x, y, w, h), match in zip(faces, self.last_matches):
+            if match is not None and match["known"]:
+                detected_known_faces.append(frame[y:y + h, x:x + w])
         return faces, detected_known_faces
 
+    def _identify_tracks(self, frame):
+        # Identity is cached on each track and only recomputed for tracks that need it,
+        # so a static scene costs no embeddings between re-verifications
+        self._frame_index += 1
+        stale = [t for t in self.tracks if self._needs_verification(t)]
+        self.identity_cache_hits += len(self.tracks) - len(stale)
+        self.identity_cache_misses += len(stale)
+        metrics.incr("identity_cache_hits", len(self.tracks) - len(stale))
+        metrics.incr("identity_cache_misses", len(stale))
+        if stale:
+            matches = self.identify_faces(frame, [t.box for t in stale])
+            for track, match in zip(stale, matches):
+                track.match = match
+                track.verified_frame = self._frame_index
+                track.verified_box = track.box
+                track.verified_gallery = self.gallery_version
+        return [t.match for t in self.tracks]
+
+    def _needs_verification(self, track):
+        if track.verified_frame is None:
+            return True
+        if track.verified_gallery < self._gallery_replaced_at:
+            return True  # gallery positions changed since, the cached index is meaningless
+        if track.verified_gallery != self.gallery_version and not (track.match and track.match["known"]):
+            return True  # unmatched track, the gallery has grown since
+        if self._frame_index - track.verified_frame >= self.reverify_interval:
+            return True
+        if _iou(track.box, track.verified_box) < self.reverify_iou:
+            return True  # moved or resized a lot since the last embedding
+        return track.match is not None and abs(track.match["score"] - self.match_threshold) < self.reverify_margin
+
+    def identify_faces(self, frame, faces, top_k=None):
+        # One match dict (or None) per box, in the order of faces
+        if len(faces) == 0 or (self.recognizer is None and not self.known_faces):
+            return [None] * len(faces)
+
+        # Embed every face of the frame in one model call
+        face_snips = [frame[y:y + h, x:x + w] for (x, y, w, h) in faces]
+        if self.recognizer is not None:
+            return self.recognizer(face_snips)
+        return self.match_embeddings(self._get_embeddings(face_snips), top_k)
+
+    def match_embeddings(self, embeddings, top_k=None):
+        # Scores every embedding against the whole gallery with one matrix multiply.
+        # Each result holds the best gallery index, its filename, the cosine score,
+        # whether it clears match_threshold and the top-k (index, name, score) candidates.
+        results = [None] * len(embeddings)
+        rows = [idx for idx, emb in enumerate(embeddings) if emb is not None]
+        if not rows or len(self.index) == 0:
+            return results
+
+        with metrics.timer("match"):
+            queries = self._normalize([embeddings[idx] for idx in rows])
+            with self._gallery_lock:
+                ids, scores = self.index.search(queries, top_k or self.top_k)
+                known_names = self.known_names
+        for row, idx in enumerate(rows):
+            candidates = [(int(j), known_names[j], float(score))
+                          for j, score in zip(ids[row], scores[row]) if j >= 0]
+            if not candidates:
+                continue
+            best, name, score = candidates[0]
+            results[idx] = {
+                "index": best,
+                "identity": name,
+                "score": score,
+                "known": score > self.match_threshold,
+                "candidates": candidates,
+            }
+        return results
+
     def _is_known(self, new_face):
         if not self.known_faces:
             return False
+        match = self.match_embeddings(self._get_embeddings([new_face]))[0]
+        return match is not None and match["known"]
 
-        new_embedding = self._get_embedding(new_face)
-        if new_embedding is None:
-            return False
+    def _normalize(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1  # zero vectors stay zero, so they score 0 against everything
+        return embeddings / norms
 
-        for _, known_embedding in self.known_faces:
-            similarity = self._cosine_similarity(new_embedding, known_embedding)
-            if similarity > 0.7:  # threshold, can be tuned
-                return True
-        return False
+    def _gallery_fingerprint(self, known_faces, vectors=None):
+        # sha1 of the names and normalized embeddings, in gallery order
+        if vectors is None:
+            vectors = self._normalize([face.embedding for face in known_faces])
+        digest = hashlib.sha1("\0".join(face.name for face in known_faces).encode())
+        digest.update(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        return digest.hexdigest()
 
-    def _get_embedding(self, face_img):
-        try:
-            from deepface import DeepFace  # moved import here
-            face_rgb = cv2.cvtColor(self._resize_face(face_img), cv2.COLOR_BGR2RGB)
-            embedding_objs = DeepFace.represent(face_rgb, model_name="Facenet", enforce_detection=False)
-            if isinstance(embedding_objs, list) and len(embedding_objs) > 0:
-                return embedding_objs[0]["embedding"]
-        except Exception:
-            pass
-        return None
+    def _build_index(self, known_faces, reuse=False):
+        index = make_index(self.index_backend, **self.index_options)
+        if not known_faces:
+            return index
+        vectors = self._normalize([face.embedding for face in known_faces])
+        fingerprint = self._gallery_fingerprint(known_faces, vectors)
+        # At startup, reuse a persisted index when it was saved for exactly this gallery
+        # (same faces, same order)
+        if reuse and self.index_path and os.path.exists(index_file(self.index_path)):
+            try:
+                persisted = load_index(self.index_path)
+                if persisted.kind == self.index_backend and persisted.fingerprint == fingerprint:
+                    return persisted
+            except Exception:
+                pass
+        index.build(np.arange(len(known_faces)), vectors)
+        if self.index_path:
+            index.save(self.index_path, fingerprint)
+        return index
 
-    def _cosine_similarity(self, emb1, emb2):
-        emb1 = np.array(emb1)
-        emb2 = np.array(emb2)
-        if np.linalg.norm(emb1) == 0 or np.linalg.norm(emb2) == 0:
-            return 0
-        return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+    def _get_embeddings(self, face_imgs):
+        with metrics.timer("embed"):
+            if self.recognition_pool is not None:
+                return self.recognition_pool.embed(face_imgs)
+            return self.embedder(face_imgs)
 
-    def _resize_face(self, face_img, size=(160, 160)):
-        return cv2.resize(face_img, size)
+    def close(self):
+        if self.recognition_pool is not None:
+            self.recognition_pool.close()
+            self.recognition_pool = None
 
     def _mse(self, img1, img2):
         # Mean Squared Error
@@ -104,15 +527,158 @@ class FaceProcessor:
         err /= float(img1.shape[0] * img1.shape[1])
         return err
 
+    def update_tracks(self, gray, frame=None):
+        # Returns self.tracks in a stable order (oldest track first)
+        if (not self.tracks or self._frames_since_detect + 1 >= self.detect_interval
+                or any(t.confidence < self.min_track_confidence for t in self.tracks)):
+            if self.roi_detection and self.tracks and self._frames_since_sweep < self.full_sweep_interval:
+                boxes = self._detect_in_rois(gray, frame)
+                self._frames_since_sweep += self._frames_since_detect + 1
+            else:
+                boxes = self.detect_boxes(gray, frame=frame)
+                self._frames_since_sweep = 0
+            self._associate(gray, boxes)
+            self._frames_since_detect = 0
+        else:
+            for track in self.tracks:
+                self._propagate(gray, track)
+            self._frames_since_detect += 1
+        return self.tracks
+
+    def detect_boxes(self, gray, roi=None, frame=None):
+        # Face detector on a detect_scale-downscaled copy of gray, or of the BGR frame for
+        # detectors that want color (optionally only inside roi = (x1, y1, x2, y2)), face
+        # size limits given in full-resolution pixels. Returns boxes in full-frame coordinates.
+        image = frame if frame is not None and getattr(self.detector, "color", False) else gray
+        x0, y0 = 0, 0
+        if roi is not None:
+            x0, y0, x2, y2 = roi
+            image = image[y0:y2, x0:x2]
+        scale = self.detect_scale
+        if scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        min_size = tuple(int(v * scale) for v in self.min_face_size) if self.min_face_size else None
+        max_size = tuple(int(v * scale) for v in self.max_face_size) if self.max_face_size else None
+        boxes = self.detector.detect(image, min_size, max_size)
+        if len(boxes) == 0:
+            return np.zeros((0, 4), dtype=np.int32)
+        boxes = np.asarray(boxes, dtype=np.float32)
+        if scale != 1.0:
+            boxes /= scale
+        boxes[:, 0] += x0
+        boxes[:, 1] += y0
+        return np.round(boxes).astype(np.int32)
+
+    def _detect_in_rois(self, gray, frame=None):
+        # Search only around known tracks: each box grown by roi_margin of its size per side
+        boxes = []
+        for track in self.tracks:
+            x, y, w, h = track.box
+            pad_x, pad_y = int(w * self.roi_margin), int(h * self.roi_margin)
+            roi = (max(0, x - pad_x), max(0, y - pad_y),
+                   min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y))
+            if roi[2] <= roi[0] or roi[3] <= roi[1]:
+                continue
+            for box in self.detect_boxes(gray, roi, frame):
+                # neighbouring ROIs overlap, keep one box per face
+                if all(_iou(box, kept) < 0.5 for kept in boxes):
+                    boxes.append(box)
+        return boxes
+
+    def _associate(self, gray, boxes):
+        # Greedy IoU matching of fresh detections to existing tracks
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        pairs = sorted(((_iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+                       reverse=True)
+        used_tracks, used_boxes = set(), set()
+        for score, ti, bi in pairs:
+            if score < self.min_track_iou:
+                break
+            if ti in used_tracks or bi in used_boxes:
+                continue
+            used_tracks.add(ti)
+            used_boxes.add(bi)
+            self._refresh_track(gray, self.tracks[ti], boxes[bi])
+
+        survivors = []
+        for ti, track in enumerate(self.tracks):
+            if ti not in used_tracks:
+                track.misses += 1
+                if track.misses > self.max_track_misses:
+                    continue
+            survivors.append(track)
+        for bi, box in enumerate(boxes):
+            if bi not in used_boxes:
+                survivors.append(Track(self._next_track_id, box, self._crop(gray, box).copy()))
+                self._next_track_id += 1
+        self.tracks = survivors
+
+    def _refresh_track(self, gray, track, box):
+        track.box = box
+        track.template = self._crop(gray, box).copy()
+        track.confidence = 1.0
+        track.misses = 0
+
+    def _propagate(self, gray, track):
+        # Template match inside the last box grown by track_search_margin on each side
+        x, y, w, h = track.box
+        th, tw = track.template.shape[:2]
+        if tw == 0 or th == 0:
+            track.confidence = 0.0
+            return
+        pad_x, pad_y = int(w * self.track_search_margin), int(h * self.track_search_margin)
+        x1, y1 = max(0, x - pad_x), max(0, y - pad_y)
+        x2, y2 = min(gray.shape[1], x + w + pad_x), min(gray.shape[0], y + h + pad_y)
+        roi = gray[y1:y2, x1:x2]
+        if roi.shape[0] < th or roi.shape[1] < tw:
+            track.confidence = 0.0
+            return
+        result = cv2.matchTemplate(roi, track.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(result)
+        track.box = (x1 + mx, y1 + my, tw, th)
+        track.confidence = float(score)
+
+    def _crop(self, img, box):
+        x, y, w, h = box
+        return img[max(0, y):y + h, max(0, x):x + w]
+
     def set_tracked_index(self, index):
         self.tracked_index = index
+        self.tracked_track_id = None
         self.smoothed_box = None  # reset smoothing
 
-    def get_tracked_box(self, faces):
-        if self.tracked_index is None or self.tracked_index >= len(faces):
+    def _selected_track(self):
+        # Lock onto the track matched to the selected face and follow its id from then on.
+        # Only a recognized track is chosen; a followed track that a re-verification
+        # matches to someone else is let go.
+        if self.tracked_index is None:
             return None
+        for track in self.tracks:
+            if track.track_id == self.tracked_track_id:
+                if not (track.match and track.match["known"] and track.match["index"] != self.tracked_index):
+                    return track
+                self.tracked_track_id = None
+                break
+        chosen = None
+        for track in self.tracks:
+            if track.match is not None and track.match["known"] and track.match["index"] == self.tracked_index:
+                chosen = track
+                break
+        if chosen is not None:
+            self.tracked_track_id = chosen.track_id
+            self.smoothed_box = None
+        return chosen
 
-        x, y, w, h = faces[self.tracked_index]
+    def get_tracked_box(self, faces):
+        if self.tracking_mode:
+            track = self._selected_track()
+            if track is None:
+                return None
+            x, y, w, h = track.box
+        elif self.tracked_index is None or self.tracked_index >= len(faces):
+            return None
+        else:
+            x, y, w, h = faces[self.tracked_index]
         margin = self.tracking_margin  # use dynamic margin
         cx, cy = x + w / 2, y + h / 2
         w *= (1 + margin * 2)
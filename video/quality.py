@@ -0,0 +1,126 @@
+# video/quality.py
+import time
+
+# Quality ladder, best first. Every step down is cheaper than the one before it:
+# detection on a smaller image and less often, identities re-verified less often,
+# a smaller output frame and cheaper JPEGs for the stream.
+QUALITY_LEVELS = [
+    {"detect_scale": 1.0, "detect_interval": 5, "reverify_interval": 30, "output_height": 540, "jpeg_quality": 80},
+    {"detect_scale": 0.75, "detect_interval": 5, "reverify_interval": 30, "output_height": 540, "jpeg_quality": 80},
+    {"detect_scale": 0.5, "detect_interval": 6, "reverify_interval": 45, "output_height": 540, "jpeg_quality": 70},
+    {"detect_scale": 0.5, "detect_interval": 8, "reverify_interval": 60, "output_height": 432, "jpeg_quality": 65},
+    {"detect_scale": 0.35, "detect_interval": 10, "reverify_interval": 90, "output_height": 360, "jpeg_quality": 55},
+    {"detect_scale": 0.25, "detect_interval": 12, "reverify_interval": 120, "output_height": 270, "jpeg_quality": 45},
+]
+
+
+def apply_settings(settings, processor=None, cropper=None, broadcaster=None, async_server=None):
+    # Push one ladder entry into the live objects; each is a plain attribute read per frame.
+    # broadcaster is the Flask feed, async_server an AsyncStreamServer (either may be None).
+    if processor is not None:
+        processor.detect_scale = settings["detect_scale"]
+        processor.detect_interval = settings["detect_interval"]
+        processor.reverify_interval = settings["reverify_interval"]
+    if cropper is not None:
+        cropper.height = settings["output_height"]
+    if broadcaster is not None:
+        broadcaster.quality = settings["jpeg_quality"]
+    if async_server is not None:
+        async_server.set_quality(settings["jpeg_quality"])
+
+
+class QualityController:
+    # Holds a per-frame cost budget (1000 / target_fps, or latency_budget_ms) by moving
+    # along QUALITY_LEVELS. The measured cost is smoothed (EWMA) and checked every
+    # `window` frames: over degrade_above x budget for degrade_after checks in a row
+    # steps one level down, under improve_below x budget for improve_after checks steps
+    # one level up. The gap between the two thresholds and the slower way up are the
+    # hysteresis that keeps it from oscillating; on top of that, a level that had to be
+    # left again right after stepping up to it waits twice as long before the next try
+    # (reset once a try holds for improve_after checks). Decisions are logged and kept in
+    # `decisions`. apply(settings) is called on every change; the controller itself
+    # only sees numbers, so it can be driven by a simulated load.
+    def __init__(self, apply, target_fps=None, latency_budget_ms=None, levels=QUALITY_LEVELS, window=15,
+                 degrade_above=1.0, improve_below=0.7, degrade_after=2, improve_after=6, alpha=0.2, log=print):
+        if not target_fps and not latency_budget_ms:
+            raise ValueError("QualityController needs target_fps or latency_budget_ms")
+        self.apply = apply
+        self.budget_ms = latency_budget_ms or 1000.0 / target_fps
+        self.levels = levels
+        self.window = window
+        self.degrade_above = degrade_above
+        self.improve_below = improve_below
+        self.degrade_after = degrade_after
+        self.improve_after = improve_after
+        self.alpha = alpha
+        self.log = log
+        self.level = 0
+        self.cost_ms = None  # smoothed per-frame cost
+        self.frames = 0
+        self.decisions = []  # (frame, from level, to level, smoothed cost ms)
+        self._since_check = 0
+        self._over = 0
+        self._under = 0
+        self._backoff = [0] * len(levels)  # per level: failed step-ups to it in a row
+        self._checks_at_level = 0
+        self._probing = False  # current level was reached by stepping up and hasn't held yet
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, frame_ms):
+        # Feed one frame's cost; returns the new settings when the level changed
+        self.frames += 1
+        self.cost_ms = frame_ms if self.cost_ms is None else self.alpha * frame_ms + (1 - self.alpha) * self.cost_ms
+        self._since_check += 1
+        if self._since_check < self.window:
+            return None
+        self._since_check = 0
+        self._checks_at_level += 1
+        if self._probing and self._checks_at_level >= self.improve_after:
+            self._backoff[self.level] = 0
+            self._probing = False
+        load = self.cost_ms / self.budget_ms
+        if load > self.degrade_above:
+            self._over, self._under = self._over + 1, 0
+        elif load < self.improve_below:
+            self._over, self._under = 0, self._under + 1
+        else:
+            self._over = self._under = 0  # inside the dead band, hold
+        if self._over >= self.degrade_after and self.level < len(self.levels) - 1:
+            if self._probing:
+                self._backoff[self.level] = min(self._backoff[self.level] + 1, 5)
+            return self._change(self.level + 1)
+        if self.level > 0 and self._under >= self.improve_after * 2 ** self._backoff[self.level - 1]:
+            return self._change(self.level - 1)
+        return None
+
+    def _change(self, level):
+        previous, self.level = self.level, level
+        self._over = self._under = 0
+        self._checks_at_level = 0
+        self._probing = level < previous
+        self.decisions.append((self.frames, previous, level, round(self.cost_ms, 2)))
+        if self.log:
+            direction = "down" if level > previous else "up"
+            self.log(f"Quality {direction}: level {previous} -> {level} at {self.cost_ms:.1f} ms/frame "
+                     f"(budget {self.budget_ms:.1f} ms): {self.levels[level]}")
+        self.apply(self.levels[level])
+        return self.levels[level]
+
+    def timer(self):
+        # with controller.timer(): ... measures and observes one frame
+        return _FrameTimer(self)
+
+
+class _FrameTimer:
+    def __init__(self, controller):
+        self.controller = controller
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.controller.observe((time.perf_counter() - self.start) * 1000)
@@ -0,0 +1,145 @@
+# video/recognition_pool.py
+import atexit
+import multiprocessing
+import queue
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# Worker-process state: one warm embedder per worker, shared-memory slabs attached once
+_embedder = None
+_attached = {}
+
+
+def facenet_embedder(face_size):
+    from video.processor import FacenetEmbedder
+    return FacenetEmbedder(face_size)
+
+
+def _init_worker(embedder_factory, face_size):
+    # An initializer that raises makes Pool respawn workers forever, so a worker
+    # whose model fails to load just answers None for every face
+    global _embedder
+    try:
+        _embedder = embedder_factory(face_size)
+        _embedder([np.zeros((face_size[1], face_size[0], 3), dtype=np.uint8)])  # load the model now, not on the first frame
+    except Exception as e:
+        print(f"Recognition worker failed to load its model: {e}")
+        _embedder = None
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13
+            shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _embed_slab(name, shape, start, count):
+    if _embedder is None:
+        return [None] * count
+    crops = np.ndarray(shape, dtype=np.uint8, buffer=_attach(name).buf)
+    return _embedder(list(crops[start:start + count]))
+
+
+class RecognitionPool:
+    # Runs face embedding in worker processes so TensorFlow, OpenCV preprocessing and
+    # the GUI no longer share one GIL. Snips are resized into shared-memory slabs and
+    # only slab names and row ranges cross the process boundary. Each submitted batch
+    # is split into one chunk per worker; results are handed back in submission order.
+    def __init__(self, workers=2, face_size=(160, 160), max_faces=32, slabs=None, embedder_factory=facenet_embedder):
+        self.workers = workers
+        self.face_size = face_size
+        self.max_faces = max_faces
+        self._shape = (max_faces, face_size[1], face_size[0], 3)
+        self._slabs = [shared_memory.SharedMemory(create=True, size=int(np.prod(self._shape)))
+                       for _ in range(slabs or 2 * workers)]
+        self._free = queue.Queue()
+        for slab in self._slabs:
+            self._free.put(slab)
+        ctx = multiprocessing.get_context("spawn")  # never fork a process that may hold TensorFlow state
+        self._pool = ctx.Pool(workers, initializer=_init_worker, initargs=(embedder_factory, face_size))
+        self._pending = OrderedDict()  # ticket -> [(slab, [(async_result, count), ...]), ...]
+        self._next_ticket = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    def submit(self, face_imgs):
+        # Queues BGR snips for embedding and returns a ticket. Blocks while every slab
+        # is in flight, which bounds the work queued ahead of collect()/wait().
+        parts = []
+        for start in range(0, len(face_imgs), self.max_faces):
+            chunk = face_imgs[start:start + self.max_faces]
+            slab = self._free.get()
+            view = np.ndarray(self._shape, dtype=np.uint8, buffer=slab.buf)
+            for row, face_img in enumerate(chunk):
+                view[row] = cv2.resize(face_img, self.face_size)
+            per_worker = -(-len(chunk) // self.workers)
+            results = []
+            for first in range(0, len(chunk), per_worker):
+                count = min(per_worker, len(chunk) - first)
+                results.append((self._pool.apply_async(_embed_slab, (slab.name, self._shape, first, count)), count))
+            parts.append((slab, results))
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._pending[ticket] = parts
+        return ticket
+
+    def _finish(self, parts, timeout=None):
+        embeddings = []
+        for slab, results in parts:
+            for result, count in results:
+                try:
+                    embeddings.extend(result.get(timeout))
+                except Exception:
+                    embeddings.extend([None] * count)
+            self._free.put(slab)  # every chunk of this slab is done with it
+        return embeddings
+
+    def wait(self, ticket, timeout=None):
+        # Embeddings for one ticket, in the order the snips were submitted
+        with self._lock:
+            parts = self._pending.pop(ticket)
+        return self._finish(parts, timeout)
+
+    def collect(self, block=False):
+        # (ticket, embeddings) for finished batches, strictly in submission order:
+        # a batch is only returned once every batch submitted before it is done
+        done = []
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return done
+                ticket, parts = next(iter(self._pending.items()))
+                ready = all(result.ready() for _, results in parts for result, _ in results)
+                if not (ready or block):
+                    return done
+                del self._pending[ticket]
+            done.append((ticket, self._finish(parts)))
+
+    def embed(self, face_imgs):
+        # Synchronous drop-in for FacenetEmbedder.__call__
+        if len(face_imgs) == 0:
+            return []
+        return self.wait(self.submit(face_imgs))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool.terminate()
+        for slab in self._slabs:
+            slab.close()
+            try:
+                slab.unlink()
+            except FileNotFoundError:
+                pass
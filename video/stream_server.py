@@ -1,23 +1,155 @@
 import cv2
 import threading
-from flask import Flask, Response
+from flask import Flask, Response, request
+from video.events import MetadataBroadcaster, sse_message
+from video.metrics import metrics
 
 app = Flask(__name__)
-frame_lock = threading.Lock()
-current_frame = None
 
-@app.route('/')
-def video_feed():
+
+class FrameBroadcaster:
+    # Latest output frame plus a sequence number. Each new frame is JPEG-encoded once,
+    # by whichever client asks first, and the bytes are shared by every client.
+    # Clients block on the condition until the sequence moves instead of polling.
+    def __init__(self, quality=80):
+        self.quality = quality
+        self.seq = 0
+        self._frame = None
+        self._cond = threading.Condition()
+        self._encode_lock = threading.Lock()
+        self._jpeg = None
+        self._jpeg_seq = -1
+
+    def publish(self, frame):
+        with self._cond:
+            self._frame = frame
+            self.seq += 1
+            self._cond.notify_all()
+
+    def wait_frame(self, last_seq, timeout=1.0):
+        # Returns (seq, frame) for the first frame newer than last_seq, or
+        # (last_seq, None) if nothing new arrived within timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.seq != last_seq and self._frame is not None, timeout):
+                return last_seq, None
+            return self.seq, self._frame
+
+    def wait_jpeg(self, last_seq, timeout=1.0):
+        # Same as wait_frame, but returns the shared JPEG bytes
+        seq, frame = self.wait_frame(last_seq, timeout)
+        if frame is None:
+            return seq, None
+        with self._encode_lock:
+            if self._jpeg_seq < seq:
+                with metrics.timer("stream_encode"):
+                    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                if not ok:
+                    return seq, None
+                self._jpeg, self._jpeg_seq = buffer.tobytes(), seq
+            return self._jpeg_seq, self._jpeg
+
+
+broadcaster = FrameBroadcaster()
+# Detection metadata of the main feed, served as server-sent events at /events
+events = MetadataBroadcaster()
+# Extra named feeds (multi-camera mode), served at /stream/<name> and /events/<name>
+streams = {}
+event_streams = {}
+
+
+def publish_frame(frame):
+    # Called by the producer for every output frame; None clears the feed
+    broadcaster.publish(frame)
+
+
+def publish_metadata(faces):
+    # Called by the producer for every frame with video.events.face_records()
+    events.publish(faces)
+
+
+def register_stream(name, quality=80):
+    # Broadcaster for a named feed, created on first use
+    if name not in streams:
+        streams[name] = FrameBroadcaster(quality)
+    return streams[name]
+
+
+def register_events(name, rate=5.0):
+    # Metadata broadcaster for a named feed, created on first use
+    if name not in event_streams:
+        event_streams[name] = MetadataBroadcaster(rate)
+    return event_streams[name]
+
+
+def last_event_id():
+    # Where a subscriber wants to resume: EventSource's Last-Event-ID on reconnect,
+    # or ?since=<id>; None for a new subscriber
+    value = request.headers.get("Last-Event-ID") or request.args.get("since")
+    return int(value) if value and value.isdigit() else None
+
+
+def _mjpeg_response(source):
     def generate():
-        global current_frame
-        while True:
-            with frame_lock:
-                if current_frame is None:
+        seq = 0
+        metrics.add_gauge("stream_clients", 1)
+        try:
+            while True:
+                seq, jpeg = source.wait_jpeg(seq)
+                if jpeg is None:
                     continue
-                _, buffer = cv2.imencode('.jpg', current_frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        finally:
+            metrics.add_gauge("stream_clients", -1)
     return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
+
+def _sse_response(source, since, keepalive=15.0):
+    def generate():
+        metrics.add_gauge("event_clients", 1)
+        try:
+            backlog = source.events_since(since)
+            for event in backlog:
+                yield sse_message(event)
+            last = backlog[-1][0] if backlog else min(since or 0, source.last_id)
+            while True:
+                pending = source.wait_events(last, keepalive)
+                if not pending:
+                    yield b": keepalive\n\n"  # keeps proxies from closing an idle stream
+                    continue
+                for event in pending:
+                    yield sse_message(event)
+                last = pending[-1][0]
+        finally:
+            metrics.add_gauge("event_clients", -1)
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+@app.route('/')
+def video_feed():
+    return _mjpeg_response(broadcaster)
+
+
+@app.route('/stream/<name>')
+def named_feed(name):
+    if name not in streams:
+        return Response("Unknown stream", status=404, mimetype='text/plain')
+    return _mjpeg_response(streams[name])
+
+@app.route('/events')
+def metadata_events():
+    return _sse_response(events, last_event_id())
+
+
+@app.route('/events/<name>')
+def named_events(name):
+    if name not in event_streams:
+        return Response("Unknown stream", status=404, mimetype='text/plain')
+    return _sse_response(event_streams[name], last_event_id())
+
+@app.route('/metrics')
+def metrics_text():
+    return Response(metrics.render_text(), mimetype='text/plain; version=0.0.4')
+
 def start_stream_server():
     app.run(host='0.0.0.0', port=8080, debug=False, threaded=True)
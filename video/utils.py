@@ -0,0 +1,74 @@
+# video/utils.py
+import cv2
+import numpy as np
+
+TARGET_RATIOS = {
+    "16:9": 16 / 9,
+    "1:1": 1.0,
+    "16:10": 16 / 10
+}
+
+
+def output_size(ratio_str, height=540):
+    # Output frame size for a ratio at the given height; width rounded to even for video encoders
+    ratio = TARGET_RATIOS.get(ratio_str, 16 / 9)
+    return int(round(height * ratio / 2)) * 2, height
+
+
+def source_roi(frame_shape, box, ratio_str):
+    # Final (x, y, w, h) source region for a tracked box in one step: the box clipped to
+    # the frame, then center-cropped to the target ratio. Same region as the old
+    # crop-then-ratio path (kept in benchmarks/pipeline.py), without slicing twice.
+    fh, fw = frame_shape[:2]
+    x1, y1, x2, y2 = 0, 0, fw, fh
+    if box is not None:
+        x, y, w_box, h_box = box
+        x1, y1 = int(max(0, x)), int(max(0, y))
+        x2, y2 = int(min(fw, x1 + w_box)), int(min(fh, y1 + h_box))
+        if x2 <= x1 or y2 <= y1:
+            x1, y1, x2, y2 = 0, 0, fw, fh  # box left the frame, show everything
+    w, h = x2 - x1, y2 - y1
+    target_ratio = TARGET_RATIOS.get(ratio_str, 16 / 9)
+    if w / h > target_ratio:
+        new_w = max(1, int(h * target_ratio))
+        x1 += (w - new_w) // 2
+        w = new_w
+    else:
+        new_h = max(1, int(w / target_ratio))
+        y1 += (h - new_h) // 2
+        h = new_h
+    return x1, y1, w, h
+
+
+class FrameCropper:
+    # Fused crop -> aspect ratio -> resize stage. Each call resizes the source ROI
+    # straight into the next of `buffers` preallocated output frames and returns it.
+    # A returned frame stays untouched until `buffers` more frames have been produced,
+    # which is what lets display, virtual camera and stream share it without copies.
+    # size=None derives the output size from the ratio at `height`.
+    def __init__(self, ratio="16:9", size=None, height=540, buffers=6):
+        self.ratio = ratio
+        self.fixed_size = size
+        self.height = height
+        self.buffers = buffers
+        self._ring = []
+        self._next = 0
+
+    @property
+    def size(self):
+        return self.fixed_size or output_size(self.ratio, self.height)
+
+    def _buffer(self, size):
+        w, h = size
+        if not self._ring or self._ring[0].shape[:2] != (h, w):
+            self._ring = [np.empty((h, w, 3), dtype=np.uint8) for _ in range(self.buffers)]
+        out = self._ring[self._next % len(self._ring)]
+        self._next += 1
+        return out
+
+    def __call__(self, frame, box=None):
+        size = self.size
+        x, y, w, h = source_roi(frame.shape, box, self.ratio)
+        out = self._buffer(size)
+        cv2.resize(frame[y:y + h, x:x + w], size, dst=out)
+        return out
@@ -0,0 +1,101 @@
+# video/virtual_cam.py
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from video.metrics import metrics
+
+
+class VirtualCamSink:
+    # Feeds a virtual camera from its own thread at the device's fps and resolution.
+    # The producer only hands over its newest frame (submit); the sink sends whatever
+    # is newest on every tick, repeating the last frame when processing is slower than
+    # the device and skipping frames when it is faster. Frames of another size are
+    # letterboxed into a preallocated device-sized buffer.
+    # device: anything with send(frame), width and height (pyvirtualcam.Camera, or a
+    # fake in tests); clock and sleep are injectable for the same reason.
+    def __init__(self, device, fps=None, clock=time.monotonic, sleep=time.sleep):
+        self.device = device
+        self.fps = fps or getattr(device, "fps", None) or 30
+        self.size = (device.width, device.height)
+        self.clock = clock
+        self.sleep = sleep
+        self.sent = 0
+        self.repeated = 0  # ticks that re-sent an already sent frame
+        self.skipped = 0  # submitted frames replaced before any tick sent them
+        self._frame = None
+        self._seq = 0
+        self._sent_seq = 0
+        self._lock = threading.Lock()
+        self._canvas = np.zeros((self.size[1], self.size[0], 3), dtype=np.uint8)
+        self._fitted_seq = -1
+        self._running = threading.Event()
+        self._thread = None
+
+    def submit(self, frame):
+        # Called by the producer for every output frame (BGR, any size)
+        with self._lock:
+            self._frame = frame
+            self._seq += 1
+
+    def start(self):
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="virtual-cam", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running.clear()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def stats(self):
+        return {"fps": self.fps, "sent": self.sent, "repeated": self.repeated, "skipped": self.skipped}
+
+    def _run(self):
+        period = 1.0 / self.fps
+        deadline = self.clock()
+        while self._running.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Virtual cam error: {e}")
+            deadline += period
+            delay = deadline - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+            elif delay < -period:
+                deadline = self.clock()  # fell behind (slow device), don't send a burst to catch up
+
+    def tick(self):
+        # One device frame: the newest submitted frame, or the previous one again
+        with self._lock:
+            frame, seq = self._frame, self._seq
+        if frame is None:
+            return False
+        if seq == self._sent_seq:
+            self.repeated += 1
+        else:
+            self.skipped += seq - self._sent_seq - 1
+        with metrics.timer("virtual_cam"):
+            self.device.send(self._fit(frame, seq))
+        self._sent_seq = seq
+        self.sent += 1
+        return True
+
+    def _fit(self, frame, seq):
+        # Frames already at the device size go out as they are, no copy
+        h, w = frame.shape[:2]
+        if (w, h) == self.size:
+            return frame
+        if seq != self._fitted_seq:
+            dw, dh = self.size
+            scale = min(dw / w, dh / h)
+            fw, fh = max(1, int(w * scale)), max(1, int(h * scale))
+            x, y = (dw - fw) // 2, (dh - fh) // 2
+            self._canvas[...] = 0
+            self._canvas[y:y + fh, x:x + fw] = cv2.resize(frame, (fw, fh), interpolation=cv2.INTER_AREA)
+            self._fitted_seq = seq
+        return self._canvas